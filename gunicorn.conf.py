@@ -0,0 +1,16 @@
+# gunicorn -c gunicorn.conf.py main:app
+import multiprocessing
+import os
+
+# password hashing and JWT checks are CPU-bound; one process per core-ish
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# each worker holds its own SQLAlchemy pool plus one LISTEN connection, so
+# Postgres sees up to workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW + 1) connections;
+# with the main.py defaults (5 + 10, SQLAlchemy's own) that is 16 per worker.
+# main.py also caps each worker's sync threadpool at DB_POOL_SIZE + DB_MAX_OVERFLOW,
+# so the two limits move together. Keep the total under the server's
+# max_connections (Supabase's pooler limit on small plans) by lowering
+# WEB_CONCURRENCY rather than the pool alone.
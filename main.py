@@ -1,31 +1,51 @@
 import os
+import base64
 import csv
 import io
+import hashlib
+import heapq
+import logging
+import queue
+import select
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
 from typing import Optional, List, Literal, Dict, Any
 from uuid import UUID, uuid4
 
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import FileResponse, Response
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Query
 
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from jose import jwt, JWTError
-from passlib.context import CryptContext
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
-from sqlalchemy import text, bindparam
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy import text, table, column, insert
 from sqlalchemy.dialects.postgresql import JSONB
 
+from anyio import to_thread
 from dotenv import load_dotenv
 import json
+import orjson
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 # ---------------------------
 # Config
 # ---------------------------
@@ -33,125 +53,198 @@ SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL", "")
 JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME")
 JWT_ALG = "HS256"
 TOKEN_MINUTES = 60 * 24 * 7
+JWT_CACHE_SECONDS = 5
+TASK_TYPES_CACHE_SECONDS = 60
+PAYROLL_DUE_CACHE_SECONDS = 60
 
-pwd = CryptContext(schemes=["argon2"], deprecated="auto")
+# argon2id; existing hashes keep verifying since their params are in the hash string
+pwd = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
 
 ROLE = Literal["admin", "supervisor"]
 STATUS = Literal["pending", "approved", "rejected"]
 FREQ = Literal["weekly", "biweekly", "monthly"]
 
-DAILY_TARGET_KG_EQUIV = Decimal("1.0")
-METRES_PER_KG_EQUIV = Decimal("60.0")  # your rubric target basis
-
-engine: Engine = create_engine(SUPABASE_DB_URL, pool_pre_ping=True)
+DAILY_TARGET_KG_EQUIV = 1.0
+METRES_PER_KG_EQUIV = 60.0  # your rubric target basis
+RUBRIC_DIGITS = 9
+
+D0 = Decimal("0")
+Q2 = Decimal("0.01")  # kobo: approved_pay_ngn quantum
+
+# per-process pool: every gunicorn worker gets its own, so the server sees
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW + 1 LISTEN) connections (see gunicorn.conf.py).
+# The sync-handler threadpool is capped to the same size at startup, so
+# requests wait for a thread rather than time out on connection checkout.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+engine: Engine = create_engine(
+    SUPABASE_DB_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    # replace connections once they are 5 minutes old, before the server side drops them
+    pool_recycle=300,
+    # text() executemany UPDATEs (bulk decide) go through execute_batch;
+    # Core insert() executemany (audit rows) is paged into multi-row VALUES
+    executemany_mode="values_plus_batch",
+    executemany_batch_page_size=1000,
+)
+
+@contextmanager
+def ro_conn():
+    """Autocommit connection for handlers that only read: no BEGIN/COMMIT round-trips."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        yield conn
+
+@contextmanager
+def rw_conn():
+    """engine.begin() for handlers that write; follow-up work runs only after COMMIT succeeds."""
+    with engine.begin() as conn:
+        conn.info["audit_rows"] = []
+        try:
+            yield conn
+        finally:
+            # taken off the pooled connection before it goes back to the pool
+            audit_rows = conn.info.pop("audit_rows")
+    # only reached once COMMIT has gone through
+    for row in audit_rows:
+        audit_queue.put_nowait(row)
+    if audit_rows:
+        # every audited write can move payroll numbers
+        _payroll_due_cache.clear()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-    
-
-def bearer_token(request: Request) -> str:
-    auth = request.headers.get("Authorization", "")
-    if not auth.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing bearer token")
-    return auth.split(" ", 1)[1].strip()
 
-def current_user(request: Request):
-    token = bearer_token(request)
-    try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        user_id = UUID(data["sub"])
-        role = data["role"]
-        return {"id": user_id, "role": role}
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-        
-
-def get_current_user(token: str = Depends(oauth2_scheme)):
+class TTLCache:
+    """Small thread-safe LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # bumped by clear(); see set(generation=...)
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return default
+            expires, value = hit
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None, generation: Optional[int] = None):
+        """
+        generation, if given, is self.generation read before computing value;
+        the set is dropped if a clear() landed in between, since value may
+        predate whatever the clear was for.
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+
+_jwt_cache = TTLCache(maxsize=10_000, ttl=JWT_CACHE_SECONDS)
+
+def decode_token(token: str) -> Dict[str, Any]:
     """
-    Returns a dict like:
-      {"id": "<uuid>", "email": "...", "role": "admin|supervisor", "factory_id": "<uuid or None>"}
+    jwt.decode with a short per-process cache keyed by the token's SHA-256,
+    so repeat requests with the same bearer skip the HMAC + JSON parse.
+    Entries never outlive the token's exp. Raises JWTError like jwt.decode.
     """
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+    key = hashlib.sha256(token.encode()).hexdigest()
+    payload = _jwt_cache.get(key)
+    if payload is not None:
+        return payload
 
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    # optional exp check (jose validates exp automatically if present, but keep safe)
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    ttl = float(JWT_CACHE_SECONDS)
     exp = payload.get("exp")
     if exp is not None:
-        if datetime.fromtimestamp(exp, tz=timezone.utc) < datetime.now(tz=timezone.utc):
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
-
-    user_id = payload.get("sub")
-    email = payload.get("email")
-    role = payload.get("role")
-    factory_id = payload.get("factory_id")
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        _jwt_cache.set(key, payload, ttl)
+    return payload
 
-    if not user_id or not email or role not in ("admin", "supervisor"):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token claims")
 
-    return {
-        "id": user_id,
-        "email": email,
-        "role": role,
-        "factory_id": factory_id,
-    }
-
-def require_admin(u=Depends(get_current_user)):
-    if u["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Admin only")
-    return u
-
-def require_supervisor_or_admin(u=Depends(get_current_user)):
-    if u["role"] not in ("admin", "supervisor"):
-        raise HTTPException(status_code=403, detail="Forbidden")
-    return u
+def current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    # oauth2_scheme already 401s on a missing/non-bearer Authorization header
+    try:
+        data = decode_token(token)
+        return {"id": UUID(data["sub"]), "role": data["role"], "factory_id": data.get("factory_id")}
+    except (JWTError, KeyError, ValueError):
+        raise HTTPException(401, "Invalid token")
 
 def require_admin(u=Depends(current_user)):
     if u["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Admin only")
+        raise HTTPException(403, "Admin only")
     return u
 
 
 # ---------------------------
 # App
 # ---------------------------
-app = FastAPI(title="Banana Fibre Production (Admin/Supervisor)")
+app = FastAPI(title="Banana Fibre Production (Admin/Supervisor)", default_response_class=ORJSONResponse)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-@app.get("/")
-def index():
-    return FileResponse("static/index.html")
-    
+@app.on_event("startup")
+async def size_threadpool():
+    # anyio defaults to 40 threads; more than the pool can serve just queue on checkout
+    to_thread.current_default_thread_limiter().total_tokens = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
 @app.get("/api/healthz")
 def healthz():
     return {"ok": True}
 
 
+SQL_ME = text("select email, role from app_users where id=:id")
+
 @app.get("/api/me")
 def me_endpoint(u=Depends(current_user)):
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("select email, role from app_users where id=:id"),
-            {"id": str(u["id"])},
-        ).fetchone()
+    with ro_conn() as conn:
+        row = conn.execute(SQL_ME, {"id": str(u["id"])}).fetchone()
         if not row:
             raise HTTPException(401, "User not found")
     return {"email": row[0], "role": row[1]}
 
+SQL_TASK_TYPES = text("""
+  select id, code, name, unit, default_rate_ngn::float8 as default_rate_ngn
+  from task_types order by name asc
+""")
+
+_task_types_cache = TTLCache(maxsize=1, ttl=TASK_TYPES_CACHE_SECONDS)
+
+def cached_task_types() -> tuple:
+    """(rows for /api/task-types, {task_type_id: default rate}); reloaded at most once a minute."""
+    hit = _task_types_cache.get("all")
+    if hit is None:
+        with ro_conn() as conn:
+            rows = [dict(r) for r in conn.execute(SQL_TASK_TYPES).mappings()]
+        rates = {str(r["id"]): Decimal(str(r["default_rate_ngn"] or 0)) for r in rows}
+        hit = (rows, rates)
+        _task_types_cache.set("all", hit)
+    return hit
+
 @app.get("/api/task-types", dependencies=[Depends(current_user)])
 def task_types_endpoint():
-    with engine.begin() as conn:
-        rows = conn.execute(
-            text("select id, code, name, unit, default_rate_ngn from task_types order by name asc")
-        ).fetchall()
-    return [
-        {"id": r[0], "code": r[1], "name": r[2], "unit": r[3], "default_rate_ngn": float(r[4])}
-        for r in rows
-    ]
+    return ORJSONResponse(cached_task_types()[0])
 
 
 
@@ -163,54 +256,139 @@ def db():
         raise RuntimeError("SUPABASE_DB_URL not set")
     return engine
 
-def create_token(user_id: UUID, role: ROLE) -> str:
+def create_token(user_id: UUID, role: ROLE, factory_id: Optional[UUID] = None) -> str:
     exp = datetime.utcnow() + timedelta(minutes=TOKEN_MINUTES)
     payload = {"sub": str(user_id), "role": role, "exp": exp}
+    if factory_id:
+        payload["factory_id"] = str(factory_id)
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
-def bearer_token(request: Request) -> str:
-    auth = request.headers.get("Authorization", "")
-    if not auth.startswith("Bearer "):
-        raise HTTPException(401, "Missing bearer token")
-    return auth.split(" ", 1)[1].strip()
+# keyset pagination: the cursor is the sort key of the last row returned
+DEFAULT_PAGE_LIMIT = 200
+MAX_PAGE_LIMIT = 1000
 
-def current_user(request: Request) -> Dict[str, Any]:
-    token = bearer_token(request)
+def page_limit(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """
+    Page size for a keyset list. None (no LIMIT: the whole list, which is
+    what the shipped client reads) when neither limit nor cursor was given;
+    otherwise limit clamped to 1..MAX_PAGE_LIMIT, DEFAULT_PAGE_LIMIT if unset.
+    Handlers bind :lim to limit + 1, or to None, which is LIMIT NULL.
+    """
+    if limit is None:
+        return None if cursor is None else DEFAULT_PAGE_LIMIT
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(jsonable_encoder(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+# how decode_cursor turns each JSON value back into a bind parameter;
+# uuids stay strings, like every other id the handlers bind
+_CURSOR_PARSERS = {
+    str: str,
+    UUID: lambda v: str(UUID(v)),
+    date: date.fromisoformat,
+    datetime: datetime.fromisoformat,
+}
+
+def decode_cursor(cursor: str, *types) -> List[Any]:
+    """
+    Values encoded by encode_cursor, one per entry of types (str, UUID, date
+    or datetime) and parsed as that type, so a tampered cursor is a 400
+    here rather than a DataError in the query.
+    """
     try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        return {"id": UUID(data["sub"]), "role": data["role"]}
-    except (JWTError, KeyError, ValueError):
-        raise HTTPException(401, "Invalid token")
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return [_CURSOR_PARSERS[t](v) for t, v in zip(types, values)]
+    except (TypeError, ValueError, AttributeError):
+        raise HTTPException(400, "Invalid cursor")
+
+def stream_json_list(items, next_cursor: Optional[str] = None) -> StreamingResponse:
+    """Serialize a JSON array one item at a time; next page cursor goes in X-Next-Cursor."""
+    def gen():
+        yield b"["
+        for i, item in enumerate(items):
+            yield (b"," if i else b"") + orjson.dumps(item)
+        yield b"]"
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return StreamingResponse(gen(), media_type="application/json", headers=headers)
+
+@lru_cache(maxsize=None)
+def update_sql(table: str, cols: tuple) -> TextClause:
+    """
+    `update <table> set <col> = :<col>, ... where id = :id`, built once per
+    column combination. table/cols are always literals from the handlers,
+    never request data.
+    """
+    sets = ", ".join(f"{c} = :{c}" for c in cols)
+    return text(f"update {table} set {sets} where id = :id")
 
-def require_admin(u=Depends(current_user)):
-    if u["role"] != "admin":
-        raise HTTPException(403, "Admin only")
-    return u
+CSV_CHUNK_BYTES = 16 * 1024
+CSV_BATCH_ROWS = 1000
+COPY_SPOOL_BYTES = 8 * 1024 * 1024
 
-def rubric_from_logged(combed_kg: Decimal, woven_m: Decimal) -> Dict[str, Any]:
-    progress = combed_kg + (woven_m / METRES_PER_KG_EQUIV)
+def copy_csv(stmt: TextClause, params: Dict[str, Any]):
+    """
+    Yield the result of stmt as CSV formatted by Postgres (COPY ... TO STDOUT),
+    in CSV_CHUNK_BYTES pieces. copy_expert only writes to a file, so the output
+    is spooled (to disk past COPY_SPOOL_BYTES) and the connection goes back to
+    the pool before the client starts reading.
+    """
+    compiled = stmt.compile(dialect=engine.dialect)
+    with tempfile.SpooledTemporaryFile(COPY_SPOOL_BYTES) as buf:
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                sql = cur.mogrify(str(compiled), compiled.construct_params(params)).decode()
+                cur.copy_expert(f"copy ({sql}) to stdout with (format csv)", buf)
+        finally:
+            raw.close()
+        buf.seek(0)
+        while chunk := buf.read(CSV_CHUNK_BYTES):
+            yield chunk
+
+def stream_csv(rows, filename: str, copy: Optional[tuple] = None) -> StreamingResponse:
+    """
+    Stream an iterable of CSV rows (lists or DB rows; None is written as an
+    empty field), writing CSV_BATCH_ROWS at a time with writerows and
+    flushing every CSV_CHUNK_BYTES. copy=(stmt, params) appends the output of
+    copy_csv after those rows; lines then end in \n to match COPY.
+    """
+    def gen():
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n" if copy else "\r\n")
+        it = iter(rows)
+        while batch := list(islice(it, CSV_BATCH_ROWS)):
+            w.writerows(batch)
+            if buf.tell() >= CSV_CHUNK_BYTES:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+        if copy:
+            yield from copy_csv(*copy)
+    return StreamingResponse(gen(), media_type="text/csv",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+def rubric_from_logged(combed_kg: float, woven_m: float) -> Dict[str, Any]:
+    # rounded to RUBRIC_DIGITS so float noise can't flip the threshold
+    # (0.21 kg + 47.4 m is 0.9999999999999999 unrounded)
+    progress = round(combed_kg + (woven_m / METRES_PER_KG_EQUIV), RUBRIC_DIGITS)
     target_met = progress >= DAILY_TARGET_KG_EQUIV
 
-    weaving_needed = Decimal("0")
-    combing_needed = Decimal("0")
-
-    if combed_kg < Decimal("1"):
-        weaving_needed = (Decimal("1") - combed_kg) * METRES_PER_KG_EQUIV
-        if weaving_needed < 0:
-            weaving_needed = Decimal("0")
-
-    if woven_m < METRES_PER_KG_EQUIV:
-        combing_needed = (METRES_PER_KG_EQUIV - woven_m) / METRES_PER_KG_EQUIV
-        if combing_needed < 0:
-            combing_needed = Decimal("0")
+    weaving_needed = max(0.0, round((1.0 - combed_kg) * METRES_PER_KG_EQUIV, RUBRIC_DIGITS))
+    combing_needed = max(0.0, round((METRES_PER_KG_EQUIV - woven_m) / METRES_PER_KG_EQUIV, RUBRIC_DIGITS))
 
     return {
-        "progress_kg_equiv": float(progress),
-        "target_met": bool(target_met),
-        "weaving_needed_m": float(weaving_needed),
-        "combing_needed_kg": float(combing_needed),
+        "progress_kg_equiv": progress,
+        "target_met": target_met,
+        "weaving_needed_m": weaving_needed,
+        "combing_needed_kg": combing_needed,
     }
 
+@lru_cache(maxsize=4096)
 def period_for_worker(freq: FREQ, anchor: date, as_of: date) -> tuple[date, date]:
     """
     Stable cycles:
@@ -237,102 +415,213 @@ def period_for_worker(freq: FREQ, anchor: date, as_of: date) -> tuple[date, date
         end = as_of
     return start, end
 
-def effective_rate(conn, worker_id: UUID, task_type_id: UUID) -> Decimal:
-    # worker override first
-    r = conn.execute(
-        text("""
-          select rate_ngn from worker_rates
-          where worker_id = :wid and task_type_id = :tid
-        """),
-        {"wid": str(worker_id), "tid": str(task_type_id)}
-    ).fetchone()
-    if r:
-        return Decimal(str(r[0]))
-
-    d = conn.execute(
-        text("select default_rate_ngn from task_types where id = :tid"),
-        {"tid": str(task_type_id)}
-    ).fetchone()
-    return Decimal(str(d[0] if d else 0))
+# period_for_worker in SQL, as CTEs ending in periods(worker_id, full_name,
+# payout, ps, pe) for active workers: monthly is the calendar month to date,
+# weekly and biweekly are 7/14-day blocks from the anchor, clamped to :as_of.
+# Weekly/biweekly workers without an anchor have no period and are left out.
+WORKER_PERIODS_CTE = """
+  w as (
+    select id, full_name, payout, payout_anchor_date as anchor,
+           case payout when 'weekly' then 7 else 14 end as blk,
+           cast(:as_of as date) - payout_anchor_date as d
+    from workers
+    where is_active = true
+      and (payout = 'monthly' or payout_anchor_date is not null)
+  ),
+  starts as (
+    select id, full_name, payout, blk,
+           case
+             when payout = 'monthly' then date_trunc('month', cast(:as_of as date))::date
+             when d < 0 then anchor
+             else anchor + (d / blk) * blk
+           end as ps
+    from w
+  ),
+  periods as (
+    select id as worker_id, full_name, payout, ps,
+           case
+             when payout = 'monthly' then cast(:as_of as date)
+             else least(ps + blk - 1, cast(:as_of as date))
+           end as pe
+    from starts
+  )"""
+
+SQL_WORKER_RATES = text("""
+  select worker_id, task_type_id, rate_ngn from worker_rates
+  where worker_id = any(cast(:wids as uuid[])) and task_type_id = any(cast(:tids as uuid[]))
+""")
+
+def effective_rates(conn, pairs) -> Dict[tuple, Decimal]:
+    """
+    Rates for many (worker_id, task_type_id) pairs in one query, keyed by
+    (str(worker_id), str(task_type_id)): worker override first, cached task
+    type default otherwise.
+    """
+    keys = {(str(w), str(t)) for w, t in pairs}
+    if not keys:
+        return {}
+    defaults = cached_task_types()[1]
+    out = {k: defaults.get(k[1], D0) for k in keys}
+    rows = conn.execute(SQL_WORKER_RATES, {
+        "wids": list({k[0] for k in keys}),
+        "tids": list({k[1] for k in keys}),
+    })
+    for wid, tid, rate in rows:
+        k = (str(wid), str(tid))
+        if k in out and rate is not None:
+            out[k] = rate
+    return out
 
 
-def audit(conn, actor_id, actor_role, action, entity_type, entity_id, metadata: Optional[Dict[str, Any]] = None):
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 0.05
 
-    meta = metadata or {}
+# Core insert (not text()) so executemany goes out as multi-row VALUES pages
+audit_logs_table = table(
+    "audit_logs",
+    column("actor_id"),
+    column("actor_role"),
+    column("action"),
+    column("entity_type"),
+    column("entity_id"),
+    column("metadata", JSONB),
+    column("created_at"),
+)
+SQL_INSERT_AUDIT = insert(audit_logs_table)
 
-    stmt = text("""
-        insert into audit_logs (actor_id, actor_role, action, entity_type, entity_id, metadata)
-        values (:actor_id, :actor_role, :action, :entity_type, :entity_id, :meta)
-    """).bindparams(
-        bindparam("meta", type_=JSONB)
-    )
+audit_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+
+def audit(conn, actor_id, actor_role, action, entity_type, entity_id, metadata: Optional[Dict[str, Any]] = None):
+    """
+    Records an audit row against conn's transaction, which must come from
+    rw_conn(). Nothing is written inline: rw_conn() hands the rows to the
+    background writer once COMMIT succeeds (and drops them otherwise).
+    """
+    # encoded here (UUID/date -> str) so a bad payload fails this request,
+    # not a whole batch in the writer thread
+    metadata = jsonable_encoder(metadata or {})
 
-    conn.execute(stmt, {
+    conn.info["audit_rows"].append({
         "actor_id": str(actor_id),
         "actor_role": actor_role,
         "action": action,
         "entity_type": entity_type,
         "entity_id": str(entity_id) if entity_id else None,
-        "meta": meta,
+        "metadata": metadata,
+        # stamped here so batching doesn't collapse rows onto one insert time
+        "created_at": datetime.now(timezone.utc),
     })
 
 
-def compute_period(payout: str, anchor: date, as_of: date):
-    """
-    Returns (period_start, period_end) inclusive dates for the period containing as_of.
-    payout: weekly|biweekly|monthly
-    anchor: anchor date (defines boundaries)
-    """
-    if payout in ("weekly", "biweekly"):
-        days = 7 if payout == "weekly" else 14
-        delta = (as_of - anchor).days
-        if delta < 0:
-            # move backwards in blocks
-            blocks = (abs(delta) + days - 1) // days
-            start = anchor - timedelta(days=blocks * days)
-        else:
-            blocks = delta // days
-            start = anchor + timedelta(days=blocks * days)
-        end = start + timedelta(days=days - 1)
-        return start, end
+def _write_audit_rows(rows: List[Dict[str, Any]]):
+    try:
+        with engine.begin() as conn:
+            conn.execute(SQL_INSERT_AUDIT, rows)
+    except Exception:
+        if len(rows) == 1:
+            logger.exception("Failed to write audit row %s", rows[0]["action"])
+            return
+        # retry one by one so a single bad row doesn't take the batch with it
+        logger.exception("Failed to write %d audit rows as a batch; retrying singly", len(rows))
+        for row in rows:
+            _write_audit_rows([row])
 
-    # monthly: anchor day-of-month defines boundary
-    # we interpret "period start" as anchor day in a month, and period end day before next anchor.
-    anchor_dom = anchor.day
-
-    def add_month(d: date):
-        y = d.year + (d.month // 12)
-        m = (d.month % 12) + 1
-        # clamp day
-        import calendar
-        last = calendar.monthrange(y, m)[1]
-        return date(y, m, min(d.day, last))
-
-    # find most recent anchor date <= as_of
-    # start at same month as as_of, on anchor_dom (clamped)
-    import calendar
-    last = calendar.monthrange(as_of.year, as_of.month)[1]
-    cand = date(as_of.year, as_of.month, min(anchor_dom, last))
-    if cand > as_of:
-        # move to previous month
-        y = as_of.year if as_of.month > 1 else as_of.year - 1
-        m = as_of.month - 1 if as_of.month > 1 else 12
-        last2 = calendar.monthrange(y, m)[1]
-        cand = date(y, m, min(anchor_dom, last2))
-
-    start = cand
-    next_anchor = add_month(start)
-    end = next_anchor - timedelta(days=1)
-    return start, end
 
+def _audit_writer():
+    """
+    Drains audit_queue, writing up to AUDIT_BATCH_SIZE rows (or whatever
+    arrived within AUDIT_FLUSH_SECONDS) per insert. A None item stops it.
+    """
+    stop = False
+    while not stop:
+        row = audit_queue.get()
+        if row is None:
+            break
+        batch = [row]
+        deadline = time.monotonic() + AUDIT_FLUSH_SECONDS
+        while len(batch) < AUDIT_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = audit_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if row is None:
+                stop = True
+                break
+            batch.append(row)
+        _write_audit_rows(batch)
+
+
+_audit_thread: Optional[threading.Thread] = None
+
+@app.on_event("startup")
+def start_audit_writer():
+    global _audit_thread
+    _audit_thread = threading.Thread(target=_audit_writer, name="audit-writer", daemon=True)
+    _audit_thread.start()
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    if _audit_thread is not None:
+        audit_queue.put(None)
+        _audit_thread.join(timeout=5)
+
+
+# compute_period (payroll_due's period rule) in SQL, as CTEs ending in
+# due_periods(worker_id, full_name, payout, ps, pe) for :as_of:
+# - weekly/biweekly: 7/14-day blocks from the anchor (floor, also before it)
+# - monthly: starts on the anchor's day-of-month (clamped to the month's
+#   length) and ends the day before the same day next month
+# {scope} is an extra workers predicate, always a literal.
+DUE_PERIODS_CTE = """
+  dw as (
+    select id, full_name, payout, payout_anchor_date as anchor,
+           extract(day from payout_anchor_date)::int as aday,
+           case payout when 'weekly' then 7 when 'biweekly' then 14 end as blk,
+           date_trunc('month', cast(:as_of as timestamp))::date as m0
+    from workers
+    where is_active = true and payout_anchor_date is not null{scope}
+  ),
+  dm as (
+    select *, m0 + least(aday, extract(day from m0 + interval '1 month - 1 day')::int) - 1 as cur
+    from dw
+  ),
+  dstarts as (
+    select id, full_name, payout, blk,
+           case
+             when blk is not null then cast(:as_of as date) - ((cast(:as_of as date) - anchor) % blk + blk) % blk
+             when cur <= cast(:as_of as date) then cur
+             else (m0 - interval '1 month')::date + least(aday, extract(day from m0 - 1)::int) - 1
+           end as ps
+    from dm
+  ),
+  due_periods as (
+    select id as worker_id, full_name, payout, ps,
+           case
+             when blk is not null then ps + blk - 1
+             else (date_trunc('month', ps::timestamp) + interval '1 month')::date
+                  + least(extract(day from ps)::int,
+                          extract(day from date_trunc('month', ps::timestamp) + interval '2 month - 1 day')::int) - 2
+           end as pe
+    from dstarts
+  )"""
 
 # ---------------------------
 # Schemas
 # ---------------------------
+def normalize_email(v: str) -> str:
+    # emails are stored lower-cased; see migrations/001_app_users_email.sql
+    return v.strip().lower()
+
 class LoginIn(BaseModel):
     email: str
     password: str
 
+    _norm_email = field_validator("email")(normalize_email)
+
 class TokenOut(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -343,6 +632,8 @@ class CreateAppUserIn(BaseModel):
     role: ROLE = "supervisor"
     factory_id: Optional[UUID] = None
 
+    _norm_email = field_validator("email")(normalize_email)
+
 class CreateWorkerIn(BaseModel):
     worker_code: Optional[str] = None
     full_name: str
@@ -404,33 +695,35 @@ class WorkerUpdateIn(BaseModel):
 # ---------------------------
 # Auth endpoints
 # ---------------------------
+SQL_LOGIN_USER = text("""select id, password_hash, role, is_active, factory_id
+                         from app_users where email = :e""")
+
 @app.post("/api/auth/login", response_model=TokenOut)
 def login(body: LoginIn):
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("""select id, password_hash, role, is_active
-                    from app_users where email = :e"""),
-            {"e": body.email.lower().strip()},
-        ).fetchone()
+    with ro_conn() as conn:
+        row = conn.execute(SQL_LOGIN_USER, {"e": body.email}).fetchone()
 
-        if not row or not row[3]:
-            raise HTTPException(400, "Invalid credentials")
-        if not pwd.verify(body.password, row[1]):
-            raise HTTPException(400, "Invalid credentials")
+    # connection is back in the pool before the (slow, CPU-bound) argon2 check
+    if not row or not row[3]:
+        raise HTTPException(400, "Invalid credentials")
+    try:
+        pwd.verify(row[1], body.password)
+    except (VerificationError, InvalidHashError):
+        raise HTTPException(400, "Invalid credentials")
 
-        #token = create_token(UUID(row[0]), row[2])
-        token = create_token(row[0] if isinstance(row[0], UUID) else UUID(str(row[0])), row[2])
+    #token = create_token(UUID(row[0]), row[2])
+    token = create_token(row[0] if isinstance(row[0], UUID) else UUID(str(row[0])), row[2], row[4])
 
-        return TokenOut(access_token=token)
+    return TokenOut(access_token=token)
 
 @app.post("/api/admin/app-users", dependencies=[Depends(require_admin)])
 def create_app_user(body: CreateAppUserIn):
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         conn.execute(
             text("""insert into app_users (email, password_hash, role, factory_id)
                     values (:e, :p, :r, :f)"""),
             {
-                "e": body.email.lower().strip(),
+                "e": body.email,
                 "p": pwd.hash(body.password),
                 "r": body.role,
                 "f": str(body.factory_id) if body.factory_id else None,
@@ -440,50 +733,40 @@ def create_app_user(body: CreateAppUserIn):
     
 @app.get("/api/admin/app-users", dependencies=[Depends(require_admin)])
 def list_app_users():
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
+    with ro_conn() as conn:
+        return ORJSONResponse([dict(r) for r in conn.execute(text("""
           select id, email, role, factory_id, is_active, created_at
           from app_users
           order by created_at desc
-        """)).fetchall()
-    return [{
-        "id": r[0],
-        "email": r[1],
-        "role": r[2],
-        "factory_id": r[3],
-        "is_active": bool(r[4]),
-        "created_at": r[5],
-    } for r in rows]
+        """)).mappings()])
 
 
-@app.patch("/api/admin/app-users/{user_id}", dependencies=[Depends(require_admin)])
-def update_app_user(user_id: UUID, body: AppUserUpdateIn, u=Depends(get_current_user)):
+@app.patch("/api/admin/app-users/{user_id}")
+def update_app_user(user_id: UUID, body: AppUserUpdateIn, u=Depends(require_admin)):
     payload = body.model_dump(exclude_unset=True)
 
     if not payload:
         return {"ok": True}
 
-    sets = []
-    params = {"id": str(user_id)}
+    values = {}
 
     if "role" in payload and payload["role"] is not None:
-        sets.append("role = :role")
-        params["role"] = payload["role"]
+        values["role"] = payload["role"]
 
     if "factory_id" in payload:
-        sets.append("factory_id = :fid")
-        params["fid"] = str(payload["factory_id"]) if payload["factory_id"] else None
+        values["factory_id"] = str(payload["factory_id"]) if payload["factory_id"] else None
 
     if "is_active" in payload and payload["is_active"] is not None:
-        sets.append("is_active = :act")
-        params["act"] = bool(payload["is_active"])
+        values["is_active"] = bool(payload["is_active"])
 
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         r = conn.execute(text("select id from app_users where id=:id"), {"id": str(user_id)}).fetchone()
         if not r:
             raise HTTPException(404, "User not found")
+        if not values:
+            return {"ok": True}
 
-        conn.execute(text(f"update app_users set {', '.join(sets)} where id=:id"), params)
+        conn.execute(update_sql("app_users", tuple(values)), {"id": str(user_id), **values})
         audit(conn, u["id"], u["role"], "APPUSER_UPDATE", "app_user", user_id, payload)
 
     return {"ok": True}
@@ -498,35 +781,13 @@ def require_role(allowed: set[str]):
 
 require_admin_or_supervisor = require_role({"admin", "supervisor"})
 
-def can_decide_task(conn, decider_id: UUID, decider_role: str, task_id: UUID) -> bool:
-    """
-    Rule:
-    - Admin can decide any task
-    - Supervisor can decide tasks they logged (i.e., work_day.logged_by == supervisor id)
-    """
-    if decider_role == "admin":
-        return True
-    row = conn.execute(
-        text("""
-          select wd.logged_by
-          from work_tasks wt
-          join work_days wd on wd.id = wt.work_day_id
-          where wt.id = :tid
-        """),
-        {"tid": str(task_id)},
-    ).fetchone()
-    if not row:
-        return False
-    return str(row[0]) == str(decider_id)
-
-
 # ---------------------------
 # Worker management
 # ---------------------------
 @app.post("/api/workers", dependencies=[Depends(current_user)], response_model=WorkerOut)
 def create_worker(body: CreateWorkerIn):
     wid = uuid4()
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         conn.execute(
             text("""insert into workers
               (id, worker_code, full_name, factory_id, team_id, payout, payout_anchor_date)
@@ -556,73 +817,83 @@ def create_worker(body: CreateWorkerIn):
         is_active=row[5],
     )
 
+@lru_cache(maxsize=None)
+def _admin_workers_sql(include_inactive: bool, has_cursor: bool) -> TextClause:
+    conds = []
+    if not include_inactive:
+        conds.append("is_active = true")
+    if has_cursor:
+        conds.append("(full_name, id) > (:cn, :cid)")
+    where = (" where " + " and ".join(conds)) if conds else ""
+    return text(f"""
+      select id, worker_code, full_name, payout, payout_anchor_date, factory_id, team_id, is_active, created_at
+      from workers
+      {where}
+      order by full_name asc, id asc
+      limit :lim
+    """)
+
 @app.get("/api/admin/workers", dependencies=[Depends(require_admin)])
-def admin_list_workers(include_inactive: bool = Query(default=True)):
-    where = "" if include_inactive else " where is_active = true "
-    with engine.begin() as conn:
-        rows = conn.execute(text(f"""
-          select id, worker_code, full_name, payout, payout_anchor_date, factory_id, team_id, is_active, created_at
-          from workers
-          {where}
-          order by full_name asc
-        """)).fetchall()
+def admin_list_workers(
+    include_inactive: bool = Query(default=True),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    limit = page_limit(limit, cursor)
+    params = {"lim": None if limit is None else limit + 1}
+    if cursor:
+        params["cn"], params["cid"] = decode_cursor(cursor, str, UUID)
 
-    return [{
-        "id": r[0],
-        "worker_code": r[1],
-        "full_name": r[2],
-        "payout": r[3],
-        "payout_anchor_date": r[4],
-        "factory_id": r[5],
-        "team_id": r[6],
-        "is_active": bool(r[7]),
-        "created_at": r[8],
-    } for r in rows]
+    with ro_conn() as conn:
+        rows = conn.execute(
+            _admin_workers_sql(include_inactive, bool(cursor)), params
+        ).mappings().all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["full_name"], rows[-1]["id"])
+
+    return stream_json_list((dict(r) for r in rows), next_cursor)
 
     
-@app.patch("/api/workers/{worker_id}", dependencies=[Depends(require_admin)])
-def update_worker(worker_id: UUID, body: WorkerUpdateIn, u=Depends(get_current_user)):
+@app.patch("/api/workers/{worker_id}")
+def update_worker(worker_id: UUID, body: WorkerUpdateIn, u=Depends(require_admin)):
     payload = body.model_dump(exclude_unset=True)
     if not payload:
         return {"ok": True}
 
-    sets = []
-    params = {"id": str(worker_id)}
+    values = {}
 
     if "worker_code" in payload:
-        sets.append("worker_code = :code")
-        params["code"] = payload["worker_code"]
+        values["worker_code"] = payload["worker_code"]
 
     if "full_name" in payload and payload["full_name"] is not None:
-        sets.append("full_name = :name")
-        params["name"] = payload["full_name"]
+        values["full_name"] = payload["full_name"]
 
     if "payout" in payload and payload["payout"] is not None:
-        sets.append("payout = :payout")
-        params["payout"] = payload["payout"]
+        values["payout"] = payload["payout"]
 
     if "payout_anchor_date" in payload and payload["payout_anchor_date"] is not None:
-        sets.append("payout_anchor_date = :anchor")
-        params["anchor"] = payload["payout_anchor_date"]
+        values["payout_anchor_date"] = payload["payout_anchor_date"]
 
     if "factory_id" in payload:
-        sets.append("factory_id = :fid")
-        params["fid"] = str(payload["factory_id"]) if payload["factory_id"] else None
+        values["factory_id"] = str(payload["factory_id"]) if payload["factory_id"] else None
 
     if "team_id" in payload:
-        sets.append("team_id = :tid")
-        params["tid"] = str(payload["team_id"]) if payload["team_id"] else None
+        values["team_id"] = str(payload["team_id"]) if payload["team_id"] else None
 
     if "is_active" in payload and payload["is_active"] is not None:
-        sets.append("is_active = :act")
-        params["act"] = bool(payload["is_active"])
+        values["is_active"] = bool(payload["is_active"])
 
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         r = conn.execute(text("select id from workers where id=:id"), {"id": str(worker_id)}).fetchone()
         if not r:
             raise HTTPException(404, "Worker not found")
+        if not values:
+            return {"ok": True}
 
-        conn.execute(text(f"update workers set {', '.join(sets)} where id=:id"), params)
+        conn.execute(update_sql("workers", tuple(values)), {"id": str(worker_id), **values})
         audit(conn, u["id"], u["role"], "WORKER_UPDATE", "worker", worker_id, payload)
 
     return {"ok": True}
@@ -630,34 +901,29 @@ def update_worker(worker_id: UUID, body: WorkerUpdateIn, u=Depends(get_current_u
 
 @app.get("/api/workers", dependencies=[Depends(current_user)])
 def list_workers():
-    with engine.begin() as conn:
-        rows = conn.execute(
+    with ro_conn() as conn:
+        return ORJSONResponse([dict(r) for r in conn.execute(
             text("""select id, worker_code, full_name, payout, payout_anchor_date, is_active
                     from workers where is_active = true
                     order by full_name asc""")
-        ).fetchall()
-    return [
-        {
-            "id": r[0], "worker_code": r[1], "full_name": r[2],
-            "payout": r[3], "payout_anchor_date": r[4], "is_active": r[5]
-        }
-        for r in rows
-    ]
+        ).mappings()])
 
 # ---------------------------
 # Work logging
 # ---------------------------
-@app.post("/api/work-days", dependencies=[Depends(current_user)])
+SQL_UPSERT_WORK_DAY = text("""insert into work_days (worker_id, work_date, logged_by, workstation_id, day_note)
+                               values (:wid, :d, :by, :ws, :note)
+                               on conflict (worker_id, work_date)
+                               do update set workstation_id = excluded.workstation_id, day_note = excluded.day_note
+                               returning id""")
+
+@app.post("/api/work-days")
 def create_work_day(body: WorkDayCreateIn, u=Depends(current_user)):
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         # upsert: one day per worker
 
         row = conn.execute(
-            text("""insert into work_days (worker_id, work_date, logged_by, workstation_id, day_note)
-                    values (:wid, :d, :by, :ws, :note)
-                    on conflict (worker_id, work_date)
-                    do update set workstation_id = excluded.workstation_id, day_note = excluded.day_note
-                    returning id"""),
+            SQL_UPSERT_WORK_DAY,
             {
                 "wid": str(body.worker_id),
                 "d": body.work_date,
@@ -676,19 +942,23 @@ def create_work_day(body: WorkDayCreateIn, u=Depends(current_user)):
 
     return {"work_day_id": str(row[0])}
     
-@app.post("/api/work-tasks", dependencies=[Depends(current_user)])
+SQL_WORK_DAY_IS_CLOSED = text("select is_closed from work_days where id=:wd")
+SQL_INSERT_WORK_TASK = text("""
+  insert into work_tasks (id, work_day_id, task_type_id, quantity, note)
+  values (:id, :wd, :tt, :q, :note)
+  on conflict (id) do nothing
+""")
+
+@app.post("/api/work-tasks")
 def add_work_task(body: WorkTaskCreateIn, u=Depends(current_user)):
     if body.quantity < 0:
         raise HTTPException(400, "Quantity cannot be negative")
 
     tid = body.id or uuid4()
 
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         # Block changes if the day is closed
-        wd = conn.execute(
-            text("select is_closed from work_days where id=:wd"),
-            {"wd": str(body.work_day_id)}
-        ).fetchone()
+        wd = conn.execute(SQL_WORK_DAY_IS_CLOSED, {"wd": str(body.work_day_id)}).fetchone()
         if not wd:
             raise HTTPException(404, "Work day not found")
         if wd[0]:
@@ -696,11 +966,7 @@ def add_work_task(body: WorkTaskCreateIn, u=Depends(current_user)):
 
         # Insert task; ON CONFLICT makes offline replay safe
         conn.execute(
-            text("""
-              insert into work_tasks (id, work_day_id, task_type_id, quantity, note)
-              values (:id, :wd, :tt, :q, :note)
-              on conflict (id) do nothing
-            """),
+            SQL_INSERT_WORK_TASK,
             {
                 "id": str(tid),
                 "wd": str(body.work_day_id),
@@ -721,109 +987,100 @@ def add_work_task(body: WorkTaskCreateIn, u=Depends(current_user)):
 
 
 
-@app.get("/api/work-days/{worker_id}")
-def get_worker_days(worker_id: UUID, start: Optional[date] = None, end: Optional[date] = None, u=Depends(current_user)):
-    q = """select wd.id, wd.work_date, wd.day_note, wd.is_closed, wd.closed_at
+@lru_cache(maxsize=None)
+def _worker_days_sql(has_start: bool, has_end: bool) -> TextClause:
+    # one round-trip: days + their tasks (grouped in Python below), with the
+    # per-day rubric totals summed by the DB
+    q = """select wd.id, wd.work_date, wd.day_note, wd.is_closed, wd.closed_at,
+                  (sum(case when tt.code = 'COMBING' then wt.quantity else 0 end) over w)::float8 as combed_logged,
+                  (sum(case when tt.code = 'WEAVING' then wt.quantity else 0 end) over w)::float8 as woven_logged,
+                  (sum(case when tt.code = 'COMBING' and wt.status = 'approved' then wt.quantity else 0 end) over w)::float8 as combed_appr,
+                  (sum(case when tt.code = 'WEAVING' and wt.status = 'approved' then wt.quantity else 0 end) over w)::float8 as woven_appr,
+                  wt.id, tt.code, tt.name, tt.unit, wt.quantity::float8, wt.status, wt.approved_pay_ngn::float8, wt.note,
+                  wt.decided_at, wt.decision_reason
            from work_days wd
+           left join work_tasks wt on wt.work_day_id = wd.id
+           left join task_types tt on tt.id = wt.task_type_id
            where wd.worker_id = :wid"""
+    if has_start:
+        q += " and wd.work_date >= :s"
+    if has_end:
+        q += " and wd.work_date <= :e"
+    q += " window w as (partition by wd.id)"
+    q += " order by wd.work_date desc, wt.created_at asc"
+    return text(q)
+
+@app.get("/api/work-days/{worker_id}")
+def get_worker_days(worker_id: UUID, start: Optional[date] = None, end: Optional[date] = None, u=Depends(current_user)):
     params = {"wid": str(worker_id)}
     if start:
-        q += " and wd.work_date >= :s"
         params["s"] = start
     if end:
-        q += " and wd.work_date <= :e"
         params["e"] = end
-    q += " order by wd.work_date desc"
 
-    with engine.begin() as conn:
-        days = conn.execute(text(q), params).fetchall()
-
-        out = []
-        for d in days:
-            tasks = conn.execute(
-                text("""
-                  select wt.id, tt.code, tt.name, tt.unit, wt.quantity, wt.status, wt.approved_pay_ngn, wt.note,
-                         wt.decided_at, wt.decision_reason
-                  from work_tasks wt
-                  join task_types tt on tt.id = wt.task_type_id
-                  where wt.work_day_id = :wd
-                  order by wt.created_at asc
-                """),
-                {"wd": str(d[0])},
-            ).fetchall()
-
-            # rubric based on LOGGED totals (show target guidance immediately)
-            combed_logged = sum(Decimal(str(t[4])) for t in tasks if t[1] == "COMBING")
-            woven_logged = sum(Decimal(str(t[4])) for t in tasks if t[1] == "WEAVING")
-            rubric_logged = rubric_from_logged(combed_logged, woven_logged)
-
-            # approved totals for payroll/verification
-            combed_appr = sum(Decimal(str(t[4])) for t in tasks if t[1] == "COMBING" and t[5] == "approved")
-            woven_appr = sum(Decimal(str(t[4])) for t in tasks if t[1] == "WEAVING" and t[5] == "approved")
-            rubric_approved = rubric_from_logged(combed_appr, woven_appr)
+    with ro_conn() as conn:
+        rows = conn.execute(_worker_days_sql(bool(start), bool(end)), params).fetchall()
 
+    out = []
+    tasks_by_day: Dict[Any, list] = {}
+    for r in rows:
+        if r[0] not in tasks_by_day:
+            tasks_by_day[r[0]] = []
             out.append({
-                "work_day_id": d[0],
-                "work_date": d[1],
-                "day_note": d[2],
-                "rubric_logged": rubric_logged,
-                "rubric_approved": rubric_approved,
-                "is_closed": bool(d[3]),
-                "closed_at": d[4],
-                "tasks": [
-                    {
-                        "id": t[0], "code": t[1], "name": t[2], "unit": t[3],
-                        "quantity": float(t[4]),
-                        "status": t[5],
-                        "approved_pay_ngn": float(t[6]),
-                        "note": t[7],
-                        "decided_at": t[8],
-                        "decision_reason": t[9],
-                    }
-                    for t in tasks
-                ]
+                "work_day_id": r[0],
+                "work_date": r[1],
+                "day_note": r[2],
+                # rubric based on LOGGED totals (show target guidance immediately)
+                "rubric_logged": rubric_from_logged(r[5], r[6]),
+                # approved totals for payroll/verification
+                "rubric_approved": rubric_from_logged(r[7], r[8]),
+                "is_closed": bool(r[3]),
+                "closed_at": r[4],
+                "tasks": tasks_by_day[r[0]],
+            })
+        t = r[9:]
+        if t[0] is not None:
+            tasks_by_day[r[0]].append({
+                "id": t[0], "code": t[1], "name": t[2], "unit": t[3],
+                "quantity": t[4],
+                "status": t[5],
+                "approved_pay_ngn": t[6],
+                "note": t[7],
+                "decided_at": t[8],
+                "decision_reason": t[9],
             })
     return out
 
-@app.get("/api/approvals/pending", dependencies=[Depends(require_admin_or_supervisor)])
-def pending_tasks(
-    worker_id: Optional[UUID] = None,
-    start: Optional[date] = None,
-    end: Optional[date] = None,
-    u=Depends(current_user),
-):
+@lru_cache(maxsize=None)
+def _pending_tasks_sql(has_worker: bool, has_start: bool, has_end: bool, logged_by: bool,
+                      has_cursor: bool = False) -> TextClause:
     q = """
       select wt.id, wd.work_date, wd.worker_id, w.full_name,
              tt.code, tt.name, tt.unit,
-             wt.quantity, wt.note, wt.status, wt.created_at
+             wt.quantity::float8, wt.note, wt.status, wt.created_at
       from work_tasks wt
       join work_days wd on wd.id = wt.work_day_id
       join workers w on w.id = wd.worker_id
       join task_types tt on tt.id = wt.task_type_id
       where wt.status = 'pending'
     """
-    params = {}
-    if worker_id:
+    if has_worker:
         q += " and wd.worker_id = :wid"
-        params["wid"] = str(worker_id)
-    if start:
+    if has_start:
         q += " and wd.work_date >= :s"
-        params["s"] = start
-    if end:
+    if has_end:
         q += " and wd.work_date <= :e"
-        params["e"] = end
-
-    # supervisors only see tasks they logged
-    if u["role"] == "supervisor":
+    if logged_by:
         q += " and wd.logged_by = :by"
-        params["by"] = str(u["id"])
-
-    q += " order by wd.work_date desc, wt.created_at asc"
-
-    with engine.begin() as conn:
-        rows = conn.execute(text(q), params).fetchall()
-
-    return [{
+    if has_cursor:
+        # mixed sort directions, so no single row comparison
+        q += """ and (wd.work_date < :cd
+                  or (wd.work_date = :cd and (wt.created_at, wt.id) > (:cts, :cid)))"""
+    q += " order by wd.work_date desc, wt.created_at asc, wt.id asc limit :lim"
+    return text(q)
+
+def _pending_row(r) -> Dict[str, Any]:
+    return {
         "task_id": r[0],
         "work_date": r[1],
         "worker_id": r[2],
@@ -831,34 +1088,230 @@ def pending_tasks(
         "task_code": r[4],
         "task_name": r[5],
         "unit": r[6],
-        "quantity": float(r[7]),
+        "quantity": r[7],
         "note": r[8],
         "status": r[9],
         "created_at": r[10],
-    } for r in rows]
+    }
 
 
-@app.post("/api/work-tasks/{task_id}/decide", dependencies=[Depends(require_admin_or_supervisor)])
-def decide_task(task_id: UUID, body: WorkTaskDecisionIn, u=Depends(current_user)):
-    with engine.begin() as conn:
-        assert_workday_open_by_task(conn, task_id)
-
-        # Fetch the task + rate
-        row = conn.execute(text("""
-            select
-                wt.id,
-                wt.status,
-                wt.quantity,
-                wt.paid_run_id,
-                tt.rate_ngn_per_unit
-            from work_tasks wt
-            join task_types tt on tt.id = wt.task_type_id
-            where wt.id = :id
-        """), {"id": str(task_id)}).mappings().fetchone()
+# In-memory copy of the pending queue, kept current by LISTEN on the channel
+# the triggers in migrations/002_pending_tasks_notify.sql notify. Payload is a
+# task id, or "*" when a joined table changed and everything is reloaded.
+# While the listener is down the endpoint reads from the DB as before.
+PENDING_CHANNEL = "pending_tasks"
+PENDING_TRIGGER = "work_tasks_pending_notify"
+
+SQL_PENDING_CACHE = """
+  select wt.id, wd.work_date, wd.worker_id, w.full_name,
+         tt.code, tt.name, tt.unit,
+         wt.quantity::float8, wt.note, wt.status, wt.created_at,
+         wd.logged_by
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  join workers w on w.id = wd.worker_id
+  join task_types tt on tt.id = wt.task_type_id
+  where wt.status = 'pending'
+"""
+SQL_PENDING_CACHE_ALL = text(SQL_PENDING_CACHE)
+SQL_PENDING_CACHE_IDS = text(SQL_PENDING_CACHE + " and wt.id = any(cast(:ids as uuid[]))")
+SQL_PENDING_TRIGGER_EXISTS = text("select 1 from pg_trigger where tgname = :name")
+
+_pending_cache: Dict[str, tuple] = {}
+_pending_lock = threading.Lock()
+_pending_ready = threading.Event()
+_pending_stop = threading.Event()
+_pending_thread: Optional[threading.Thread] = None
+
+def _pending_entry(r) -> tuple:
+    # (sort key matching the SQL order, worker_id, work_date, logged_by, api row)
+    key = (-r[1].toordinal(), r[10], str(r[0]))
+    return key, str(r[2]), r[1], str(r[11]), _pending_row(r)
+
+def _load_pending(ids: Optional[set] = None):
+    with ro_conn() as conn:
+        if ids is None:
+            rows = conn.execute(SQL_PENDING_CACHE_ALL).fetchall()
+        else:
+            rows = conn.execute(SQL_PENDING_CACHE_IDS, {"ids": list(ids)}).fetchall()
+    fresh = {str(r[0]): _pending_entry(r) for r in rows}
+    with _pending_lock:
+        if ids is None:
+            _pending_cache.clear()
+        else:
+            for tid in ids:
+                _pending_cache.pop(tid, None)
+        _pending_cache.update(fresh)
+
+def _pending_listener():
+    while not _pending_stop.is_set():
+        raw = None
+        try:
+            # checked here rather than at startup so a DB that's down at boot
+            # is retried like any other listener failure
+            with ro_conn() as conn:
+                if conn.execute(SQL_PENDING_TRIGGER_EXISTS, {"name": PENDING_TRIGGER}).fetchone() is None:
+                    logger.info("%s trigger not installed; pending cache disabled", PENDING_TRIGGER)
+                    return
+            raw = engine.raw_connection()
+            dbapi = raw.driver_connection
+            raw.detach()  # never hand a LISTENing connection back to the pool
+            dbapi.autocommit = True
+            with dbapi.cursor() as cur:
+                cur.execute(f"listen {PENDING_CHANNEL}")
+            _load_pending()
+            # anything may have changed while we weren't listening
+            _payroll_due_cache.clear()
+            _pending_ready.set()
+
+            while not _pending_stop.is_set():
+                if select.select([dbapi], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi.poll()
+                ids = {n.payload for n in dbapi.notifies}
+                dbapi.notifies.clear()
+                if ids:
+                    _load_pending(None if "*" in ids else ids)
+                    # approvals, paid-marking and worker edits from any process
+                    # move due totals too; rw_conn() only clears this process
+                    _payroll_due_cache.clear()
+        except Exception:
+            logger.exception("pending listener failed; serving pending tasks from the DB")
+        finally:
+            _pending_ready.clear()
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+        _pending_stop.wait(5)
+
+def _pending_from_cache(worker_id, start, end, logged_by, after, n) -> List[Dict[str, Any]]:
+    with _pending_lock:
+        entries = list(_pending_cache.values())
+    wid = str(worker_id) if worker_id else None
+    hits = (
+        e for e in entries
+        if (wid is None or e[1] == wid)
+        and (start is None or e[2] >= start)
+        and (end is None or e[2] <= end)
+        and (logged_by is None or e[3] == logged_by)
+        and (after is None or e[0] > after)
+    )
+    key = lambda e: e[0]
+    picked = sorted(hits, key=key) if n is None else heapq.nsmallest(n, hits, key=key)
+    return [e[4] for e in picked]
+
+@app.on_event("startup")
+def start_pending_listener():
+    global _pending_thread
+    _pending_stop.clear()
+    _pending_thread = threading.Thread(target=_pending_listener, name="pending-listener", daemon=True)
+    _pending_thread.start()
+
+@app.on_event("shutdown")
+def stop_pending_listener():
+    if _pending_thread is not None:
+        _pending_stop.set()
+        _pending_thread.join(timeout=5)
+
+@app.get("/api/approvals/pending")
+def pending_tasks(
+    worker_id: Optional[UUID] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    u=Depends(require_admin_or_supervisor),
+):
+    limit = page_limit(limit, cursor)
+    params = {"lim": None if limit is None else limit + 1}
+    after = None
+    if cursor:
+        params["cd"], params["cts"], params["cid"] = decode_cursor(cursor, date, datetime, UUID)
+        after = (-params["cd"].toordinal(), params["cts"], params["cid"])
+    if worker_id:
+        params["wid"] = str(worker_id)
+    if start:
+        params["s"] = start
+    if end:
+        params["e"] = end
+
+    # supervisors only see tasks they logged
+    supervisor = u["role"] == "supervisor"
+    if supervisor:
+        params["by"] = str(u["id"])
+
+    if _pending_ready.is_set():
+        rows = _pending_from_cache(worker_id, start, end, params.get("by"), after, params["lim"])
+    else:
+        with ro_conn() as conn:
+            rows = [_pending_row(r) for r in conn.execute(
+                _pending_tasks_sql(bool(worker_id), bool(start), bool(end), supervisor, bool(cursor)), params
+            )]
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["work_date"], last["created_at"], last["task_id"])
+
+    return stream_json_list(rows, next_cursor)
+
+
+SQL_DECIDE_TASK_LOOKUP = text("""
+    select
+        wt.id,
+        wt.status,
+        wt.paid_run_id,
+        wd.logged_by,
+        wd.is_closed
+    from work_tasks wt
+    join work_days wd on wd.id = wt.work_day_id
+    where wt.id = :id
+""")
+# pay is computed by postgres: round() on numeric is half-up, same as before
+SQL_DECIDE_TASK_PRICED = text("""
+    update work_tasks wt
+    set status = :st,
+        decided_by = :by,
+        decided_at = now(),
+        decision_reason = :reason,
+        approved_pay_ngn = case
+            when :st = 'approved'
+            then round(coalesce(wt.quantity, 0) * coalesce(tt.rate_ngn_per_unit, 0), 2)
+            else 0
+        end
+    from task_types tt
+    where wt.id = :id and tt.id = wt.task_type_id
+    returning wt.approved_pay_ngn
+""")
+SQL_DECIDE_TASK = text("""
+    update work_tasks
+    set status = :st,
+        decided_by = :by,
+        decided_at = now(),
+        decision_reason = :reason,
+        approved_pay_ngn = :pay
+    where id = :id
+""")
+
+@app.post("/api/work-tasks/{task_id}/decide")
+def decide_task(task_id: UUID, body: WorkTaskDecisionIn, u=Depends(require_admin_or_supervisor)):
+    with rw_conn() as conn:
+        # Fetch the task + its work day
+        row = conn.execute(SQL_DECIDE_TASK_LOOKUP, {"id": str(task_id)}).mappings().fetchone()
 
         if not row:
             raise HTTPException(status_code=404, detail="Task not found")
 
+        if row["is_closed"] is True:
+            raise HTTPException(400, "Work day is closed")
+
+        # admins decide anything; supervisors only decide tasks on days they logged
+        if u["role"] != "admin" and str(row["logged_by"]) != str(u["id"]):
+            raise HTTPException(403, "Not allowed to decide this task")
+
         # If task already paid, don't allow decisions/changes
         if row["paid_run_id"] is not None:
             raise HTTPException(status_code=409, detail="Task already paid; cannot change decision")
@@ -869,31 +1322,15 @@ def decide_task(task_id: UUID, body: WorkTaskDecisionIn, u=Depends(current_user)
             # allow changing decision if you prefer: just delete this block
             pass
 
-        approved_pay = Decimal("0.00")
-
-        if body.status == "approved":
-            qty = Decimal(str(row["quantity"] or 0))
-            rate = Decimal(str(row["rate_ngn_per_unit"] or 0))
-            approved_pay = (qty * rate).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        conn.execute(
-            text("""
-                update work_tasks
-                set status = :st,
-                    decided_by = :by,
-                    decided_at = now(),
-                    decision_reason = :reason,
-                    approved_pay_ngn = :pay
-                where id = :id
-            """),
+        approved_pay = conn.execute(
+            SQL_DECIDE_TASK_PRICED,
             {
                 "st": body.status,
                 "by": str(u["id"]),
                 "reason": body.decision_reason,
-                "pay": str(approved_pay),
                 "id": str(task_id),
             },
-        )
+        ).scalar_one()
 
         audit(
             conn,
@@ -912,56 +1349,53 @@ class BulkDecisionIn(BaseModel):
     status: Literal["approved", "rejected"]
     decision_reason: Optional[str] = None
 
-@app.post("/api/work-tasks/bulk-decide", dependencies=[Depends(require_admin_or_supervisor)])
-def bulk_decide(body: BulkDecisionIn, u=Depends(current_user)):
+SQL_BULK_DECIDE_LOOKUP = text("""
+  select wt.id, wt.task_type_id, wt.quantity, wd.worker_id, wd.is_closed, wd.logged_by
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  where wt.id = any(cast(:ids as uuid[]))
+""")
+
+@app.post("/api/work-tasks/bulk-decide")
+def bulk_decide(body: BulkDecisionIn, u=Depends(require_admin_or_supervisor)):
     if not body.task_ids:
         return {"ok": True, "updated": 0}
 
-    updated = 0
-    with engine.begin() as conn:
+    with rw_conn() as conn:
+        found = {
+            r[0]: r for r in conn.execute(
+                SQL_BULK_DECIDE_LOOKUP, {"ids": [str(t) for t in body.task_ids]}
+            )
+        }
+
+        rates = {}
+        if body.status == "approved":
+            rates = effective_rates(conn, [(t[3], t[1]) for t in found.values()])
+
+        updates = []
         for tid in body.task_ids:
-            try:
-                assert_workday_open_by_task(conn, tid)
-            except HTTPException:
+            t = found.get(tid)
+            # skip missing tasks, closed days and tasks a supervisor didn't log
+            if t is None or t[4] is True:
                 continue
-                
-            if not can_decide_task(conn, u["id"], u["role"], tid):
-                continue  # skip tasks supervisor isn't allowed to decide
-
-            t = conn.execute(
-                text("""select wt.id, wt.task_type_id, wt.quantity, wd.worker_id
-                        from work_tasks wt
-                        join work_days wd on wd.id = wt.work_day_id
-                        where wt.id = :id"""),
-                {"id": str(tid)},
-            ).fetchone()
-            if not t:
+            if u["role"] != "admin" and str(t[5]) != str(u["id"]):
                 continue
 
-            worker_id = UUID(t[3])
-            rate = effective_rate(conn, worker_id, UUID(t[1]))
-            qty = Decimal(str(t[2]))
-
-            approved_pay = Decimal("0")
+            approved_pay = D0
             if body.status == "approved":
-                approved_pay = (qty * rate).quantize(Decimal("0.01"))
-
-            conn.execute(
-                text("""update work_tasks
-                        set status = :st,
-                            decided_by = :by,
-                            decided_at = now(),
-                            decision_reason = :reason,
-                            approved_pay_ngn = :pay
-                        where id = :id"""),
-                {"st": body.status, "by": str(u["id"]), "reason": body.decision_reason,
-                 "pay": str(approved_pay), "id": str(tid)},
-            )
-            updated += 1
-            audit(conn, u["id"], u["role"],
-		      "TASK_APPROVE" if body.status == "approved" else "TASK_REJECT",
-		      "work_task", tid, {"reason": body.decision_reason})
+                rate = rates[(str(t[3]), str(t[1]))]
+                approved_pay = (t[2] * rate).quantize(Q2)
+
+            updates.append({"st": body.status, "by": str(u["id"]), "reason": body.decision_reason,
+                            "pay": str(approved_pay), "id": str(tid)})
 
+        if updates:
+            conn.execute(SQL_DECIDE_TASK, updates)
+        for row in updates:
+            audit(conn, u["id"], u["role"],
+                  "TASK_APPROVE" if body.status == "approved" else "TASK_REJECT",
+                  "work_task", row["id"], {"reason": body.decision_reason})
+        updated = len(updates)
 
     return {"ok": True, "updated": updated}
 
@@ -969,16 +1403,27 @@ def bulk_decide(body: BulkDecisionIn, u=Depends(current_user)):
 # ---------------------------
 # Payroll (approved tasks only)
 # ---------------------------
-@app.get("/api/payroll/{worker_id}", response_model=PayrollOut)
+SQL_PAYROLL_WORKER = text("""select id, full_name, payout, payout_anchor_date
+                             from workers where id = :id""")
+SQL_PAYROLL_TOTALS = text("""
+  select coalesce(sum(wt.approved_pay_ngn), 0)::float8,
+         coalesce(sum(wt.quantity) filter (where tt.code = 'COMBING'), 0)::float8,
+         coalesce(sum(wt.quantity) filter (where tt.code = 'WEAVING'), 0)::float8
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  join task_types tt on tt.id = wt.task_type_id
+  where wd.worker_id = :wid
+    and wd.work_date between :s and :e
+    and wt.status = 'approved'
+    and wt.paid_run_id is null
+""")
+
+@app.get("/api/payroll/{worker_id:uuid}", response_model=PayrollOut)
 def payroll(worker_id: UUID, as_of: Optional[date] = None, u=Depends(current_user)):
     as_of = as_of or date.today()
 
-    with engine.begin() as conn:
-        w = conn.execute(
-            text("""select id, full_name, payout, payout_anchor_date
-                    from workers where id = :id"""),
-            {"id": str(worker_id)},
-        ).fetchone()
+    with ro_conn() as conn:
+        w = conn.execute(SQL_PAYROLL_WORKER, {"id": str(worker_id)}).fetchone()
         if not w:
             raise HTTPException(404, "Worker not found")
 
@@ -986,41 +1431,43 @@ def payroll(worker_id: UUID, as_of: Optional[date] = None, u=Depends(current_use
         anchor = w[3]
         start, end = period_for_worker(freq, anchor, as_of)
 
-        rows = conn.execute(
-            text("""
-              select tt.code, wt.quantity, wt.approved_pay_ngn
-              from work_tasks wt
-              join work_days wd on wd.id = wt.work_day_id
-              join task_types tt on tt.id = wt.task_type_id
-              where wd.worker_id = :wid
-                and wd.work_date between :s and :e
-                and wt.status = 'approved'
-                and wt.paid_run_id is null
-            """),
-            {"wid": str(worker_id), "s": start, "e": end},
-        ).fetchall()
-
-        total_pay = sum((Decimal(str(r[2] or 0)) for r in rows), Decimal("0"))
-        combed = sum((Decimal(str(r[1] or 0)) for r in rows if r[0] == "COMBING"), Decimal("0"))
-        woven  = sum((Decimal(str(r[1] or 0)) for r in rows if r[0] == "WEAVING"), Decimal("0"))
-        
+        total_pay, combed, woven = conn.execute(
+            SQL_PAYROLL_TOTALS, {"wid": str(worker_id), "s": start, "e": end}
+        ).fetchone()
+
         return PayrollOut(
 	    worker_id=UUID(str(w[0])),
 	    full_name=w[1],
 	    payout=freq,
 	    period_start=start,
 	    period_end=end,
-	    approved_total_pay_ngn=float(total_pay.quantize(Decimal("0.01"))),
-	    approved_combed_kg=float(combed),
-	    approved_woven_m=float(woven),
+	    approved_total_pay_ngn=total_pay,
+	    approved_combed_kg=combed,
+	    approved_woven_m=woven,
 	)
 
 
-@app.get("/api/payroll/{worker_id}/export.csv")
+SQL_PAYROLL_CSV_TASKS = text("""
+  select wd.work_date,
+         tt.code, tt.name, tt.unit,
+         wt.quantity::float8,
+         wt.status,
+         wt.approved_pay_ngn::float8,
+         wt.note
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  join task_types tt on tt.id = wt.task_type_id
+  where wd.worker_id = :wid
+    and wd.work_date between :s and :e
+    and wt.paid_run_id is null
+  order by wd.work_date asc, wt.created_at asc
+""")
+
+@app.get("/api/payroll/{worker_id:uuid}/export.csv")
 def payroll_csv(worker_id: UUID, as_of: Optional[date] = None, u=Depends(current_user)):
     as_of = as_of or date.today()
 
-    with engine.begin() as conn:
+    with ro_conn() as conn:
         w = conn.execute(
             text("""select full_name, payout, payout_anchor_date
                     from workers where id = :id"""),
@@ -1031,95 +1478,86 @@ def payroll_csv(worker_id: UUID, as_of: Optional[date] = None, u=Depends(current
 
         start, end = period_for_worker(w[1], w[2], as_of)
 
-        rows = conn.execute(
-            text("""
-              select wd.work_date,
-                     tt.code, tt.name, tt.unit,
-                     wt.quantity,
-                     wt.status,
-                     wt.approved_pay_ngn,
-                     wt.note
-              from work_tasks wt
-              join work_days wd on wd.id = wt.work_day_id
-              join task_types tt on tt.id = wt.task_type_id
-              where wd.worker_id = :wid
-                and wd.work_date between :s and :e
-                and wt.paid_run_id is null
-              order by wd.work_date asc, wt.created_at asc
-            """),
-            {"wid": str(worker_id), "s": start, "e": end},
-        ).fetchall()
-
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["worker", w[0]])
-    writer.writerow(["period_start", start, "period_end", end])
-    writer.writerow([])
-    writer.writerow(["date", "task_code", "task_name", "unit", "quantity", "status", "approved_pay_ngn", "note"])
-    for r in rows:
-        writer.writerow([r[0], r[1], r[2], r[3], float(r[4]), r[5], float(r[6]), r[7] or ""])
-
-    return Response(
-        content=out.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="payroll_{worker_id}_{start}_{end}.csv"'},
-    )
+    rows = [
+        ["worker", w[0]],
+        ["period_start", start, "period_end", end],
+        [],
+        ["date", "task_code", "task_name", "unit", "quantity", "status", "approved_pay_ngn", "note"],
+    ]
+    return stream_csv(rows, f"payroll_{worker_id}_{start}_{end}.csv",
+                      copy=(SQL_PAYROLL_CSV_TASKS, {"wid": str(worker_id), "s": start, "e": end}))
+
+@lru_cache(maxsize=None)
+def _payroll_all_sql(by_worker: bool, has_cursor: bool, paged: bool) -> TextClause:
+    # the page is cut from periods before the work_days/work_tasks join
+    conds = []
+    if by_worker:
+        conds.append("worker_id = :wid")
+    if has_cursor:
+        conds.append("(full_name, worker_id) > (:cn, :cid)")
+    where = (" where " + " and ".join(conds)) if conds else ""
+    limit = " limit :lim" if paged else ""
+    return text(f"""
+      with {WORKER_PERIODS_CTE},
+      page as (
+        select * from periods{where}
+        order by full_name asc, worker_id asc{limit}
+      )
+      select p.worker_id, p.full_name, p.payout, p.ps, p.pe,
+             coalesce(sum(wt.approved_pay_ngn), 0)::float8
+      from page p
+      left join work_days wd on wd.worker_id = p.worker_id and wd.work_date between p.ps and p.pe
+      left join work_tasks wt on wt.work_day_id = wd.id and wt.status = 'approved'
+      group by p.worker_id, p.full_name, p.payout, p.ps, p.pe
+      order by p.full_name asc, p.worker_id asc
+    """)
+
+def _payroll_all_row(r) -> Dict[str, Any]:
+    # UUID/date values go to orjson as-is
+    return {
+        "worker_id": r[0],
+        "full_name": r[1],
+        "payout": r[2],
+        "period_start": r[3],
+        "period_end": r[4],
+        "approved_total_pay_ngn": r[5],
+    }
 
 @app.get("/api/payroll", dependencies=[Depends(require_admin_or_supervisor)])
-def payroll_all(as_of: Optional[date] = None):
+def payroll_all(
+    as_of: Optional[date] = None,
+    worker_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
     as_of = as_of or date.today()
-    with engine.begin() as conn:
-        workers = conn.execute(text("""
-          select id, full_name, payout, payout_anchor_date
-          from workers
-          where is_active = true
-          order by full_name asc
-        """)).fetchall()
-
-        results = []
-        for w in workers:
-            wid = UUID(w[0])
-            start, end = period_for_worker(w[2], w[3], as_of)
-
-            rows = conn.execute(text("""
-              select tt.code, wt.quantity, wt.approved_pay_ngn
-              from work_tasks wt
-              join work_days wd on wd.id = wt.work_day_id
-              join task_types tt on tt.id = wt.task_type_id
-              where wd.worker_id = :wid
-                and wd.work_date between :s and :e
-                and wt.status = 'approved'
-            """), {"wid": str(wid), "s": start, "e": end}).fetchall()
-
-            total_pay = sum(Decimal(str(r[2])) for r in rows).quantize(Decimal("0.01"))
-            results.append({
-                "worker_id": str(wid),
-                "full_name": w[1],
-                "payout": w[2],
-                "period_start": start,
-                "period_end": end,
-                "approved_total_pay_ngn": float(total_pay),
-            })
-    return results
+    limit = page_limit(limit, cursor)
+    params = {"as_of": as_of, "lim": None if limit is None else limit + 1}
+    if worker_id:
+        params["wid"] = str(worker_id)
+    if cursor:
+        params["cn"], params["cid"] = decode_cursor(cursor, str, UUID)
+
+    with ro_conn() as conn:
+        rows = [_payroll_all_row(r) for r in conn.execute(
+            _payroll_all_sql(bool(worker_id), bool(cursor), True), params
+        )]
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["full_name"], rows[-1]["worker_id"])
+
+    return stream_json_list(rows, next_cursor)
 
 
 @app.get("/api/payroll/export.csv", dependencies=[Depends(require_admin_or_supervisor)])
 def payroll_all_csv(as_of: Optional[date] = None):
     as_of = as_of or date.today()
-    data = payroll_all(as_of=as_of)
-
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["as_of", as_of])
-    writer.writerow(["worker_id", "full_name", "payout", "period_start", "period_end", "approved_total_pay_ngn"])
-    for r in data:
-        writer.writerow([r["worker_id"], r["full_name"], r["payout"], r["period_start"], r["period_end"], r["approved_total_pay_ngn"]])
-
-    return Response(
-        content=out.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="payroll_all_{as_of}.csv"'},
-    )
+
+    rows = [["as_of", as_of], ["worker_id", "full_name", "payout", "period_start", "period_end", "approved_total_pay_ngn"]]
+    return stream_csv(rows, f"payroll_all_{as_of}.csv",
+                      copy=(_payroll_all_sql(False, False, False), {"as_of": as_of}))
 
 # ---------------------------
 # Settings: Factories / Teams / Workstations
@@ -1136,125 +1574,154 @@ class WorkstationIn(BaseModel):
     factory_id: UUID
     name: str
 
+SQL_LIST_FACTORIES = text("select id, name from factories order by name asc")
+SQL_INSERT_FACTORY = text("insert into factories (name) values (:n) returning id, name")
+
 @app.get("/api/factories", dependencies=[Depends(require_admin_or_supervisor)])
 def list_factories():
-    with engine.begin() as conn:
-        rows = conn.execute(text("select id, name from factories order by name asc")).fetchall()
+    with ro_conn() as conn:
+        rows = conn.execute(SQL_LIST_FACTORIES).fetchall()
     return [{"id": r[0], "name": r[1]} for r in rows]
 
 @app.post("/api/factories", dependencies=[Depends(require_admin)])
 def create_factory(body: FactoryIn):
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         row = conn.execute(
-            text("insert into factories (name) values (:n) returning id, name"),
+            SQL_INSERT_FACTORY,
             {"n": body.name.strip()},
         ).fetchone()
     return {"id": row[0], "name": row[1]}
 
-@app.get("/api/teams", dependencies=[Depends(require_admin_or_supervisor)])
-def list_teams(factory_id: Optional[UUID] = None):
-    q = "select id, factory_id, name from teams"
-    params = {}
+@lru_cache(maxsize=None)
+def _named_list_sql(table: str, by_factory: bool, has_cursor: bool) -> TextClause:
+    """Keyset page of teams/workstations by (name, id); table is always a literal."""
+    conds = []
+    if by_factory:
+        conds.append("factory_id = :f")
+    if has_cursor:
+        conds.append("(name, id) > (:cn, :cid)")
+    where = (" where " + " and ".join(conds)) if conds else ""
+    return text(f"select id, factory_id, name from {table}{where} order by name asc, id asc limit :lim")
+
+def _named_list(table: str, factory_id: Optional[UUID], cursor: Optional[str], limit: Optional[int]):
+    limit = page_limit(limit, cursor)
+    params = {"lim": None if limit is None else limit + 1}
     if factory_id:
-        q += " where factory_id = :f"
         params["f"] = str(factory_id)
-    q += " order by name asc"
-    with engine.begin() as conn:
-        rows = conn.execute(text(q), params).fetchall()
-    return [{"id": r[0], "factory_id": r[1], "name": r[2]} for r in rows]
+    if cursor:
+        params["cn"], params["cid"] = decode_cursor(cursor, str, UUID)
+
+    with ro_conn() as conn:
+        rows = conn.execute(_named_list_sql(table, bool(factory_id), bool(cursor)), params).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0])
+
+    return stream_json_list(({"id": r[0], "factory_id": r[1], "name": r[2]} for r in rows), next_cursor)
+
+SQL_INSERT_TEAM = text("""insert into teams (factory_id, name) values (:f, :n)
+                          returning id, factory_id, name""")
+
+@app.get("/api/teams", dependencies=[Depends(require_admin_or_supervisor)])
+def list_teams(
+    factory_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    return _named_list("teams", factory_id, cursor, limit)
 
 @app.post("/api/teams", dependencies=[Depends(require_admin)])
 def create_team(body: TeamIn):
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         row = conn.execute(
-            text("""insert into teams (factory_id, name) values (:f, :n)
-                    returning id, factory_id, name"""),
+            SQL_INSERT_TEAM,
             {"f": str(body.factory_id), "n": body.name.strip()},
         ).fetchone()
     return {"id": row[0], "factory_id": row[1], "name": row[2]}
 
+SQL_INSERT_WORKSTATION = text("""insert into workstations (factory_id, name) values (:f, :n)
+                                 returning id, factory_id, name""")
+
 @app.get("/api/workstations", dependencies=[Depends(require_admin_or_supervisor)])
-def list_workstations(factory_id: Optional[UUID] = None):
-    q = "select id, factory_id, name from workstations"
-    params = {}
-    if factory_id:
-        q += " where factory_id = :f"
-        params["f"] = str(factory_id)
-    q += " order by name asc"
-    with engine.begin() as conn:
-        rows = conn.execute(text(q), params).fetchall()
-    return [{"id": r[0], "factory_id": r[1], "name": r[2]} for r in rows]
+def list_workstations(
+    factory_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    return _named_list("workstations", factory_id, cursor, limit)
 
 @app.post("/api/workstations", dependencies=[Depends(require_admin)])
 def create_workstation(body: WorkstationIn):
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         row = conn.execute(
-            text("""insert into workstations (factory_id, name) values (:f, :n)
-                    returning id, factory_id, name"""),
+            SQL_INSERT_WORKSTATION,
             {"f": str(body.factory_id), "n": body.name.strip()},
         ).fetchone()
     return {"id": row[0], "factory_id": row[1], "name": row[2]}
 
 
-class WorkerUpdateIn(BaseModel):
-    full_name: Optional[str] = None
-    worker_code: Optional[str] = None
-    payout: Optional[FREQ] = None
-    payout_anchor_date: Optional[date] = None
-    factory_id: Optional[UUID] = None
-    team_id: Optional[UUID] = None
-    is_active: Optional[bool] = None
-
-@app.patch("/api/workers/{worker_id}", dependencies=[Depends(require_admin_or_supervisor)])
-def update_worker(worker_id: UUID, body: WorkerUpdateIn):
-    sets = []
-    params = {"id": str(worker_id)}
-    for k, v in body.model_dump(exclude_unset=True).items():
-        sets.append(f"{k} = :{k}")
-        params[k] = str(v) if isinstance(v, UUID) else v
-    if not sets:
-        return {"ok": True}
-    q = "update workers set " + ", ".join(sets) + " where id = :id"
-    with engine.begin() as conn:
-        conn.execute(text(q), params)
-    return {"ok": True}
-
 class WorkerRateUpsertIn(BaseModel):
     worker_id: UUID
     task_type_id: UUID
     rate_ngn: float
 
+@lru_cache(maxsize=None)
+def _worker_rates_sql(has_cursor: bool) -> TextClause:
+    after = " and (tt.name, wr.id) > (:cn, :cid)" if has_cursor else ""
+    return text(f"""
+      select wr.id, wr.worker_id, wr.task_type_id, wr.rate_ngn::float8,
+             tt.code, tt.name, tt.unit
+      from worker_rates wr
+      join task_types tt on tt.id = wr.task_type_id
+      where wr.worker_id = :wid{after}
+      order by tt.name asc, wr.id asc
+      limit :lim
+    """)
+SQL_UPSERT_WORKER_RATE = text("""
+  insert into worker_rates (worker_id, task_type_id, rate_ngn)
+  values (:w, :t, :r)
+  on conflict (worker_id, task_type_id)
+  do update set rate_ngn = excluded.rate_ngn
+""")
+SQL_DELETE_WORKER_RATE = text("delete from worker_rates where id=:id")
+
 @app.get("/api/worker-rates/{worker_id}", dependencies=[Depends(require_admin_or_supervisor)])
-def list_worker_rates(worker_id: UUID):
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
-          select wr.id, wr.worker_id, wr.task_type_id, wr.rate_ngn,
-                 tt.code, tt.name, tt.unit
-          from worker_rates wr
-          join task_types tt on tt.id = wr.task_type_id
-          where wr.worker_id = :wid
-          order by tt.name asc
-        """), {"wid": str(worker_id)}).fetchall()
-    return [{
-        "id": r[0], "worker_id": r[1], "task_type_id": r[2], "rate_ngn": float(r[3]),
+def list_worker_rates(
+    worker_id: UUID,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    limit = page_limit(limit, cursor)
+    params = {"wid": str(worker_id), "lim": None if limit is None else limit + 1}
+    if cursor:
+        params["cn"], params["cid"] = decode_cursor(cursor, str, UUID)
+
+    with ro_conn() as conn:
+        rows = conn.execute(_worker_rates_sql(bool(cursor)), params).fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+
+    return stream_json_list(({
+        "id": r[0], "worker_id": r[1], "task_type_id": r[2], "rate_ngn": r[3],
         "task_code": r[4], "task_name": r[5], "unit": r[6]
-    } for r in rows]
+    } for r in rows), next_cursor)
 
 @app.post("/api/worker-rates", dependencies=[Depends(require_admin)])
 def upsert_worker_rate(body: WorkerRateUpsertIn):
-    with engine.begin() as conn:
-        conn.execute(text("""
-          insert into worker_rates (worker_id, task_type_id, rate_ngn)
-          values (:w, :t, :r)
-          on conflict (worker_id, task_type_id)
-          do update set rate_ngn = excluded.rate_ngn
-        """), {"w": str(body.worker_id), "t": str(body.task_type_id), "r": body.rate_ngn})
+    with rw_conn() as conn:
+        conn.execute(SQL_UPSERT_WORKER_RATE,
+                     {"w": str(body.worker_id), "t": str(body.task_type_id), "r": body.rate_ngn})
     return {"ok": True}
 
 @app.delete("/api/worker-rates/{rate_id}", dependencies=[Depends(require_admin)])
 def delete_worker_rate(rate_id: UUID):
-    with engine.begin() as conn:
-        conn.execute(text("delete from worker_rates where id=:id"), {"id": str(rate_id)})
+    with rw_conn() as conn:
+        conn.execute(SQL_DELETE_WORKER_RATE, {"id": str(rate_id)})
     return {"ok": True}
     
 
@@ -1263,107 +1730,127 @@ class WorkTaskUpdateIn(BaseModel):
     note: Optional[str] = None
     task_type_id: Optional[UUID] = None
 
-@app.patch("/api/work-tasks/{task_id}", dependencies=[Depends(require_admin_or_supervisor)])
-def update_pending_task(task_id: UUID, body: WorkTaskUpdateIn, u=Depends(current_user)):
-    with engine.begin() as conn:
-        assert_workday_open_by_task(conn, task_id)
-        # Ensure task exists and is pending
-        row = conn.execute(text("""
-            select wt.id, wt.status, wd.logged_by
-            from work_tasks wt
-            join work_days wd on wd.id = wt.work_day_id
-            where wt.id = :id
-        """), {"id": str(task_id)}).fetchone()
-        if not row:
-            raise HTTPException(404, "Task not found")
-        if row[1] != "pending":
-            raise HTTPException(400, "Only pending tasks can be edited")
-        # Supervisor can only edit tasks they logged
-        if u["role"] == "supervisor" and str(row[2]) != str(u["id"]):
-            raise HTTPException(403, "Supervisors can only edit tasks they logged")
-
-        sets = []
-        params = {"id": str(task_id), "by": str(u["id"])}
-        payload = body.model_dump(exclude_unset=True)
-
-        if "quantity" in payload:
-            if payload["quantity"] is None or payload["quantity"] < 0:
-                raise HTTPException(400, "Quantity must be >= 0")
-            sets.append("quantity = :quantity")
-            params["quantity"] = payload["quantity"]
-
-        if "note" in payload:
-            sets.append("note = :note")
-            params["note"] = payload["note"]
-
-        if "task_type_id" in payload:
-            sets.append("task_type_id = :task_type_id")
-            params["task_type_id"] = str(payload["task_type_id"])
-
-        if not sets:
-            return {"ok": True}
+# edits/deletes only match a pending task on an open day (for supervisors,
+# one they logged); when nothing matches, _task_mutation_error says why
+TASK_MUTABLE = """wd.id = wt.work_day_id and wt.id = :id
+      and wt.status = 'pending' and wd.is_closed = false"""
+
+@lru_cache(maxsize=None)
+def _edit_task_sql(cols: tuple, own_only: bool) -> TextClause:
+    sets = ", ".join(f"{c} = :{c}" for c in cols)
+    owner = " and wd.logged_by = :owner" if own_only else ""
+    return text(f"""
+      update work_tasks wt set {sets}, updated_at = now(), updated_by = :by
+      from work_days wd
+      where {TASK_MUTABLE}{owner}
+      returning wt.id
+    """)
+
+@lru_cache(maxsize=None)
+def _delete_task_sql(own_only: bool) -> TextClause:
+    owner = " and wd.logged_by = :owner" if own_only else ""
+    return text(f"""
+      delete from work_tasks wt using work_days wd
+      where {TASK_MUTABLE}{owner}
+      returning wt.id
+    """)
+
+SQL_TASK_MUTATION_STATE = text("""
+  select wt.status, wd.logged_by, wd.is_closed
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  where wt.id = :id
+""")
+
+def _task_mutation_error(conn, task_id: UUID, u, verb: str, done: str) -> Optional[HTTPException]:
+    """Why an edit/delete of task_id by u can't go through; None if it can."""
+    row = conn.execute(SQL_TASK_MUTATION_STATE, {"id": str(task_id)}).fetchone()
+    if not row:
+        return HTTPException(404, "Task not found")
+    if row[2] is True:
+        return HTTPException(400, "Work day is closed")
+    if row[0] != "pending":
+        return HTTPException(400, f"Only pending tasks can be {done}")
+    if u["role"] == "supervisor" and str(row[1]) != str(u["id"]):
+        return HTTPException(403, f"Supervisors can only {verb} tasks they logged")
+    return None
+
+@app.patch("/api/work-tasks/{task_id}")
+def update_pending_task(task_id: UUID, body: WorkTaskUpdateIn, u=Depends(require_admin_or_supervisor)):
+    values = {}
+    payload = body.model_dump(exclude_unset=True)
 
-        sets.append("updated_at = now()")
-        sets.append("updated_by = :by")
+    if "quantity" in payload:
+        if payload["quantity"] is None or payload["quantity"] < 0:
+            raise HTTPException(400, "Quantity must be >= 0")
+        values["quantity"] = payload["quantity"]
 
-        conn.execute(
-            text("update work_tasks set " + ", ".join(sets) + " where id = :id"),
-            params
-        )
+    if "note" in payload:
+        values["note"] = payload["note"]
+
+    if "task_type_id" in payload:
+        values["task_type_id"] = str(payload["task_type_id"])
+
+    own_only = u["role"] == "supervisor"
+    with rw_conn() as conn:
+        if not values:
+            err = _task_mutation_error(conn, task_id, u, "edit", "edited")
+            if err:
+                raise err
+            return {"ok": True}
+
+        row = conn.execute(
+            _edit_task_sql(tuple(values), own_only),
+            {"id": str(task_id), "by": str(u["id"]), "owner": str(u["id"]), **values},
+        ).fetchone()
+        if row is None:
+            raise _task_mutation_error(conn, task_id, u, "edit", "edited") or HTTPException(409, "Task changed, try again")
 
         audit(conn, u["id"], u["role"], "TASK_EDIT", "work_task", task_id, payload)
 
     return {"ok": True}
 
 
-@app.delete("/api/work-tasks/{task_id}", dependencies=[Depends(require_admin_or_supervisor)])
-def delete_pending_task(task_id: UUID, u=Depends(current_user)):
-    with engine.begin() as conn:
-        assert_workday_open_by_task(conn, task_id)
-        row = conn.execute(text("""
-            select wt.id, wt.status, wd.logged_by
-            from work_tasks wt
-            join work_days wd on wd.id = wt.work_day_id
-            where wt.id = :id
-        """), {"id": str(task_id)}).fetchone()
-        if not row:
-            raise HTTPException(404, "Task not found")
-        if row[1] != "pending":
-            raise HTTPException(400, "Only pending tasks can be deleted")
-        if u["role"] == "supervisor" and str(row[2]) != str(u["id"]):
-            raise HTTPException(403, "Supervisors can only delete tasks they logged")
+@app.delete("/api/work-tasks/{task_id}")
+def delete_pending_task(task_id: UUID, u=Depends(require_admin_or_supervisor)):
+    own_only = u["role"] == "supervisor"
+    with rw_conn() as conn:
+        row = conn.execute(
+            _delete_task_sql(own_only), {"id": str(task_id), "owner": str(u["id"])}
+        ).fetchone()
+        if row is None:
+            raise _task_mutation_error(conn, task_id, u, "delete", "deleted") or HTTPException(409, "Task changed, try again")
 
-        conn.execute(text("delete from work_tasks where id = :id"), {"id": str(task_id)})
         audit(conn, u["id"], u["role"], "TASK_DELETE", "work_task", task_id, {})
 
     return {"ok": True}
 
 
-@app.get("/api/audit", dependencies=[Depends(require_admin)])
-def list_audit(
-    entity_type: Optional[str] = None,
-    entity_id: Optional[UUID] = None,
-    limit: int = 100
-):
-    limit = max(1, min(limit, 500))
+@lru_cache(maxsize=4)
+def audit_sql(by_type: bool, by_id: bool) -> TextClause:
+    """One statement per filter combination, so each shape is built once."""
     q = """
       select created_at, actor_role, action, entity_type, entity_id, metadata
       from audit_logs
       where 1=1
     """
-    params = {}
-    if entity_type:
+    if by_type:
         q += " and entity_type = :et"
-        params["et"] = entity_type
-    if entity_id:
+    if by_id:
         q += " and entity_id = :eid"
-        params["eid"] = str(entity_id)
+    return text(q + " order by created_at desc limit :lim")
 
-    q += " order by created_at desc limit :lim"
-    params["lim"] = limit
+@app.get("/api/audit", dependencies=[Depends(require_admin)])
+def list_audit(
+    entity_type: Optional[str] = None,
+    entity_id: Optional[UUID] = None,
+    limit: int = 100
+):
+    limit = max(1, min(limit, 500))
+    params = {"et": entity_type, "eid": str(entity_id) if entity_id else None, "lim": limit}
 
-    with engine.begin() as conn:
-        rows = conn.execute(text(q), params).fetchall()
+    with ro_conn() as conn:
+        rows = conn.execute(audit_sql(bool(entity_type), bool(entity_id)), params).fetchall()
 
     return [{
         "created_at": r[0],
@@ -1375,78 +1862,84 @@ def list_audit(
     } for r in rows]
 
 
+SQL_REPORT_TASK_TOTALS = text("""
+  select tt.code, tt.name, tt.unit,
+         coalesce(sum(wt.quantity), 0)::float8 as total_qty,
+         coalesce(sum(wt.approved_pay_ngn), 0)::float8 as total_pay
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  join task_types tt on tt.id = wt.task_type_id
+  where wd.work_date between :s and :e
+    and wt.status = 'approved'
+  group by tt.code, tt.name, tt.unit
+  order by tt.name asc
+""")
+
 @app.get("/api/reports/task-totals", dependencies=[Depends(require_admin_or_supervisor)])
 def report_task_totals(start: date, end: date):
     # sums by task type within date range (APPROVED only)
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
-          select tt.code, tt.name, tt.unit,
-                 sum(wt.quantity) as total_qty,
-                 sum(wt.approved_pay_ngn) as total_pay
-          from work_tasks wt
-          join work_days wd on wd.id = wt.work_day_id
-          join task_types tt on tt.id = wt.task_type_id
-          where wd.work_date between :s and :e
-            and wt.status = 'approved'
-          group by tt.code, tt.name, tt.unit
-          order by tt.name asc
-        """), {"s": start, "e": end}).fetchall()
+    with ro_conn() as conn:
+        rows = conn.execute(SQL_REPORT_TASK_TOTALS, {"s": start, "e": end}).fetchall()
 
     return [{
         "task_code": r[0],
         "task_name": r[1],
         "unit": r[2],
-        "total_quantity": float(r[3] or 0),
-        "total_pay_ngn": float(r[4] or 0),
+        "total_quantity": r[3],
+        "total_pay_ngn": r[4],
     } for r in rows]
 
 
+SQL_REPORT_BY_WORKSTATION = text("""
+  select coalesce(ws.name, 'Unassigned') as workstation,
+         coalesce(sum(wt.approved_pay_ngn), 0)::float8 as total_pay
+  from work_tasks wt
+  join work_days wd on wd.id = wt.work_day_id
+  left join workstations ws on ws.id = wd.workstation_id
+  where wd.work_date between :s and :e
+    and wt.status = 'approved'
+  group by coalesce(ws.name, 'Unassigned')
+  order by total_pay desc
+""")
+
 @app.get("/api/reports/by-workstation", dependencies=[Depends(require_admin_or_supervisor)])
 def report_by_workstation(start: date, end: date):
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
-          select coalesce(ws.name, 'Unassigned') as workstation,
-                 sum(wt.approved_pay_ngn) as total_pay
-          from work_tasks wt
-          join work_days wd on wd.id = wt.work_day_id
-          left join workstations ws on ws.id = wd.workstation_id
-          where wd.work_date between :s and :e
-            and wt.status = 'approved'
-          group by coalesce(ws.name, 'Unassigned')
-          order by total_pay desc
-        """), {"s": start, "e": end}).fetchall()
+    with ro_conn() as conn:
+        rows = conn.execute(SQL_REPORT_BY_WORKSTATION, {"s": start, "e": end}).fetchall()
 
-    return [{"workstation": r[0], "total_pay_ngn": float(r[1] or 0)} for r in rows]
+    return [{"workstation": r[0], "total_pay_ngn": r[1]} for r in rows]
 
 
+SQL_REPORT_BY_SUPERVISOR = text("""
+  select au.email,
+         count(distinct wd.id) as days_logged,
+         count(wt.id) filter (where wt.status='approved') as tasks_approved,
+         coalesce(sum(wt.approved_pay_ngn) filter (where wt.status='approved'), 0)::float8 as approved_pay
+  from work_days wd
+  join app_users au on au.id = wd.logged_by
+  left join work_tasks wt on wt.work_day_id = wd.id
+  where wd.work_date between :s and :e
+  group by au.email
+  order by approved_pay desc
+""")
+
 @app.get("/api/reports/by-supervisor", dependencies=[Depends(require_admin_or_supervisor)])
 def report_by_supervisor(start: date, end: date):
     # how much value each logger generated (approved pay)
-    with engine.begin() as conn:
-        rows = conn.execute(text("""
-          select au.email,
-                 count(distinct wd.id) as days_logged,
-                 count(wt.id) filter (where wt.status='approved') as tasks_approved,
-                 sum(wt.approved_pay_ngn) filter (where wt.status='approved') as approved_pay
-          from work_days wd
-          join app_users au on au.id = wd.logged_by
-          left join work_tasks wt on wt.work_day_id = wd.id
-          where wd.work_date between :s and :e
-          group by au.email
-          order by approved_pay desc nulls last
-        """), {"s": start, "e": end}).fetchall()
+    with ro_conn() as conn:
+        rows = conn.execute(SQL_REPORT_BY_SUPERVISOR, {"s": start, "e": end}).fetchall()
 
     return [{
         "supervisor_email": r[0],
-        "days_logged": int(r[1] or 0),
-        "tasks_approved": int(r[2] or 0),
-        "approved_pay_ngn": float(r[3] or 0),
+        "days_logged": r[1],
+        "tasks_approved": r[2],
+        "approved_pay_ngn": r[3],
     } for r in rows]
     
 
-@app.post("/api/work-days/{work_day_id}/close", dependencies=[Depends(require_admin_or_supervisor)])
-def close_day(work_day_id: UUID, u=Depends(current_user)):
-    with engine.begin() as conn:
+@app.post("/api/work-days/{work_day_id}/close")
+def close_day(work_day_id: UUID, u=Depends(require_admin_or_supervisor)):
+    with rw_conn() as conn:
         wd = conn.execute(text("select is_closed from work_days where id=:id"), {"id": str(work_day_id)}).fetchone()
         if not wd:
             raise HTTPException(404, "Work day not found")
@@ -1464,9 +1957,9 @@ def close_day(work_day_id: UUID, u=Depends(current_user)):
     return {"ok": True}
 
 
-@app.post("/api/work-days/{work_day_id}/reopen", dependencies=[Depends(require_admin)])
-def reopen_day(work_day_id: UUID, u=Depends(current_user)):
-    with engine.begin() as conn:
+@app.post("/api/work-days/{work_day_id}/reopen")
+def reopen_day(work_day_id: UUID, u=Depends(require_admin)):
+    with rw_conn() as conn:
         wd = conn.execute(text("select is_closed from work_days where id=:id"), {"id": str(work_day_id)}).fetchone()
         if not wd:
             raise HTTPException(404, "Work day not found")
@@ -1488,75 +1981,58 @@ class PayrollRunCreateIn(BaseModel):
     as_of: date
     note: Optional[str] = None
 
-@app.post("/api/payroll-runs", dependencies=[Depends(require_admin_or_supervisor)])
-def create_payroll_run(body: PayrollRunCreateIn, u=Depends(current_user)):
+SQL_INSERT_PAYROLL_RUN = text("""
+  insert into payroll_runs (id, as_of, created_by, note)
+  values (:id, :as_of, :by, :note)
+""")
+SQL_CREATE_PAYROLL_RUN_ITEMS = text(f"""
+  with {WORKER_PERIODS_CTE},
+  due as (
+    select p.worker_id, wt.id as task_id, wt.approved_pay_ngn, wt.quantity, tt.code
+    from periods p
+    join work_days wd on wd.worker_id = p.worker_id and wd.work_date between p.ps and p.pe
+    join work_tasks wt on wt.work_day_id = wd.id
+    join task_types tt on tt.id = wt.task_type_id
+    where wt.status = 'approved'
+      and wt.paid_run_id is null
+    -- an overlapping run blocks here; once it commits, the re-check drops
+    -- the tasks it paid from both the sums and the update below
+    for update of wt
+  ),
+  agg as (
+    select worker_id,
+           sum(approved_pay_ngn) as pay,
+           sum(case when code = 'COMBING' then quantity else 0 end) as ckg,
+           sum(case when code = 'WEAVING' then quantity else 0 end) as wm
+    from due
+    group by worker_id
+  ),
+  items as (
+    insert into payroll_run_items
+      (run_id, worker_id, worker_name, payout, period_start, period_end,
+       approved_total_pay_ngn, approved_combed_kg, approved_woven_m)
+    select :run, p.worker_id, p.full_name, p.payout, p.ps, p.pe,
+           coalesce(a.pay, 0), coalesce(a.ckg, 0), coalesce(a.wm, 0)
+    from periods p
+    left join agg a on a.worker_id = p.worker_id
+    on conflict (run_id, worker_id) do nothing
+  )
+  -- due is the locked set, so exactly the summed tasks get marked
+  update work_tasks wt
+  set paid_run_id = :run,
+      paid_at = :paid_at
+  from due
+  where wt.id = due.task_id
+""")
+
+@app.post("/api/payroll-runs")
+def create_payroll_run(body: PayrollRunCreateIn, u=Depends(require_admin_or_supervisor)):
     run_id = uuid4()
-    with engine.begin() as conn:
+    with rw_conn() as conn:
         now = datetime.now(timezone.utc)
-        conn.execute(text("""
-          insert into payroll_runs (id, as_of, created_by, note)
-          values (:id, :as_of, :by, :note)
-        """), {"id": str(run_id), "as_of": body.as_of, "by": str(u["id"]), "note": body.note})
-
-        workers_rows = conn.execute(text("""
-          select id, full_name, payout, payout_anchor_date
-          from workers
-          where is_active = true
-          order by full_name asc
-        """)).fetchall()
-
-        for w in workers_rows:
-            wid = UUID(str(w[0]))
-            start, end = period_for_worker(w[2], w[3], body.as_of)
-
-            rows = conn.execute(text("""
-	    select wt.id, tt.code, wt.quantity
-	    from work_tasks wt
-	    join work_days wd on wd.id = wt.work_day_id
-	    join task_types tt on tt.id = wt.task_type_id
-	    where wd.worker_id = :worker_id
-	      and wd.work_date between :start and :end
-	      and wt.status = 'approved'
-	      and wt.paid_run_id is null
-	"""), {"worker_id": str(worker_id), "start": period_start, "end": period_end}).fetchall()
-
-            total_pay = sum(Decimal(str(r[2])) for r in rows).quantize(Decimal("0.01"))
-            combed = sum(Decimal(str(r[1])) for r in rows if r[0] == "COMBING")
-            woven = sum(Decimal(str(r[1])) for r in rows if r[0] == "WEAVING")
-            
-            conn.execute(text("""
-              insert into payroll_run_items
-                (run_id, worker_id, worker_name, payout, period_start, period_end,
-                 approved_total_pay_ngn, approved_combed_kg, approved_woven_m)
-              values
-                (:run, :wid, :name, :payout, :ps, :pe, :pay, :ckg, :wm)
-              on conflict (run_id, worker_id) do nothing
-            """), {
-                "run": str(run_id),
-                "wid": str(wid),
-                "name": w[1],
-                "payout": w[2],
-                "ps": start,
-                "pe": end,
-                "pay": str(total_pay),
-                "ckg": str(combed),
-                "wm": str(woven),
-            })
-            
-            task_ids = [str(r[0]) for r in rows]
-            if task_ids:
-            	conn.execute(text("""
-			update work_tasks
-			set paid_run_id = :run_id,
-			    paid_at = :paid_at
-			where id = any(:task_ids::uuid[])
-			  and status = 'approved'
-			  and paid_run_id is null
-		    """), {
-			"run_id": str(run_id),
-			"paid_at": now,
-			"task_ids": task_ids
-		    })
+        conn.execute(SQL_INSERT_PAYROLL_RUN,
+                     {"id": str(run_id), "as_of": body.as_of, "by": str(u["id"]), "note": body.note})
+        conn.execute(SQL_CREATE_PAYROLL_RUN_ITEMS, {"run": str(run_id), "as_of": body.as_of, "paid_at": now})
 
         audit(conn, u["id"], u["role"], "PAYROLL_RUN_CREATE", "payroll_run", run_id, {"as_of": str(body.as_of)})
 
@@ -1565,7 +2041,7 @@ def create_payroll_run(body: PayrollRunCreateIn, u=Depends(current_user)):
 @app.get("/api/payroll-runs", dependencies=[Depends(require_admin_or_supervisor)])
 def list_payroll_runs(limit: int = 50):
     limit = max(1, min(limit, 200))
-    with engine.begin() as conn:
+    with ro_conn() as conn:
         rows = conn.execute(text("""
           select id, as_of, created_at, note
           from payroll_runs
@@ -1574,19 +2050,21 @@ def list_payroll_runs(limit: int = 50):
         """), {"lim": limit}).fetchall()
     return [{"id": r[0], "as_of": r[1], "created_at": r[2], "note": r[3]} for r in rows]
 
+SQL_PAYROLL_RUN_ITEMS = text("""
+  select worker_id, worker_name, payout, period_start, period_end,
+         approved_total_pay_ngn::float8, approved_combed_kg::float8, approved_woven_m::float8
+  from payroll_run_items
+  where run_id=:id
+  order by worker_name asc
+""")
+
 @app.get("/api/payroll-runs/{run_id}", dependencies=[Depends(require_admin_or_supervisor)])
 def get_payroll_run(run_id: UUID):
-    with engine.begin() as conn:
+    with ro_conn() as conn:
         hdr = conn.execute(text("select id, as_of, created_at, note from payroll_runs where id=:id"), {"id": str(run_id)}).fetchone()
         if not hdr:
             raise HTTPException(404, "Run not found")
-        items = conn.execute(text("""
-          select worker_id, worker_name, payout, period_start, period_end,
-                 approved_total_pay_ngn, approved_combed_kg, approved_woven_m
-          from payroll_run_items
-          where run_id=:id
-          order by worker_name asc
-        """), {"id": str(run_id)}).fetchall()
+        items = conn.execute(SQL_PAYROLL_RUN_ITEMS, {"id": str(run_id)}).fetchall()
     return {
         "run": {"id": hdr[0], "as_of": hdr[1], "created_at": hdr[2], "note": hdr[3]},
         "items": [{
@@ -1595,161 +2073,121 @@ def get_payroll_run(run_id: UUID):
             "payout": i[2],
             "period_start": i[3],
             "period_end": i[4],
-            "approved_total_pay_ngn": float(i[5]),
-            "approved_combed_kg": float(i[6]),
-            "approved_woven_m": float(i[7]),
+            "approved_total_pay_ngn": i[5],
+            "approved_combed_kg": i[6],
+            "approved_woven_m": i[7],
         } for i in items]
     }
 
 @app.get("/api/payroll-runs/{run_id}/export.csv", dependencies=[Depends(require_admin_or_supervisor)])
 def export_payroll_run_csv(run_id: UUID):
-    with engine.begin() as conn:
+    with ro_conn() as conn:
         hdr = conn.execute(text("select as_of, created_at, note from payroll_runs where id=:id"), {"id": str(run_id)}).fetchone()
         if not hdr:
             raise HTTPException(404, "Run not found")
-        items = conn.execute(text("""
-          select worker_id, worker_name, payout, period_start, period_end,
-                 approved_total_pay_ngn, approved_combed_kg, approved_woven_m
-          from payroll_run_items
-          where run_id=:id
-          order by worker_name asc
-        """), {"id": str(run_id)}).fetchall()
-
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["run_id", str(run_id)])
-    writer.writerow(["as_of", hdr[0], "created_at", hdr[1], "note", hdr[2] or ""])
-    writer.writerow([])
-    writer.writerow(["worker_id","worker_name","payout","period_start","period_end","approved_total_pay_ngn","approved_combed_kg","approved_woven_m"])
-    for i in items:
-        writer.writerow([i[0], i[1], i[2], i[3], i[4], float(i[5]), float(i[6]), float(i[7])])
-
-    return Response(
-        content=out.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="payroll_run_{run_id}.csv"'},
-    )
+
+    rows = [
+        ["run_id", str(run_id)],
+        ["as_of", hdr[0], "created_at", hdr[1], "note", hdr[2] or ""],
+        [],
+        ["worker_id","worker_name","payout","period_start","period_end","approved_total_pay_ngn","approved_combed_kg","approved_woven_m"],
+    ]
+    return stream_csv(rows, f"payroll_run_{run_id}.csv", copy=(SQL_PAYROLL_RUN_ITEMS, {"id": str(run_id)}))
 
 @app.get("/api/reports/task-totals/export.csv", dependencies=[Depends(require_admin_or_supervisor)])
 def report_task_totals_csv(start: date, end: date):
-    data = report_task_totals(start=start, end=end)
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(["start", start, "end", end])
-    w.writerow(["task_code","task_name","unit","total_quantity","total_pay_ngn"])
-    for r in data:
-        w.writerow([r["task_code"], r["task_name"], r["unit"], r["total_quantity"], r["total_pay_ngn"]])
-    return Response(out.getvalue(), media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="report_task_totals_{start}_{end}.csv"'})
+    rows = [["start", start, "end", end], ["task_code","task_name","unit","total_quantity","total_pay_ngn"]]
+    return stream_csv(rows, f"report_task_totals_{start}_{end}.csv",
+                      copy=(SQL_REPORT_TASK_TOTALS, {"s": start, "e": end}))
 
 @app.get("/api/reports/by-workstation/export.csv", dependencies=[Depends(require_admin_or_supervisor)])
 def report_by_workstation_csv(start: date, end: date):
-    data = report_by_workstation(start=start, end=end)
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(["start", start, "end", end])
-    w.writerow(["workstation","total_pay_ngn"])
-    for r in data:
-        w.writerow([r["workstation"], r["total_pay_ngn"]])
-    return Response(out.getvalue(), media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="report_workstations_{start}_{end}.csv"'})
+    rows = [["start", start, "end", end], ["workstation","total_pay_ngn"]]
+    return stream_csv(rows, f"report_workstations_{start}_{end}.csv",
+                      copy=(SQL_REPORT_BY_WORKSTATION, {"s": start, "e": end}))
 
 @app.get("/api/reports/by-supervisor/export.csv", dependencies=[Depends(require_admin_or_supervisor)])
 def report_by_supervisor_csv(start: date, end: date):
-    data = report_by_supervisor(start=start, end=end)
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(["start", start, "end", end])
-    w.writerow(["supervisor_email","days_logged","tasks_approved","approved_pay_ngn"])
-    for r in data:
-        w.writerow([r["supervisor_email"], r["days_logged"], r["tasks_approved"], r["approved_pay_ngn"]])
-    return Response(out.getvalue(), media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="report_supervisors_{start}_{end}.csv"'})
+    rows = [["start", start, "end", end], ["supervisor_email","days_logged","tasks_approved","approved_pay_ngn"]]
+    return stream_csv(rows, f"report_supervisors_{start}_{end}.csv",
+                      copy=(SQL_REPORT_BY_SUPERVISOR, {"s": start, "e": end}))
         
 
+@lru_cache(maxsize=None)
+def _payroll_due_sql(scoped: bool) -> TextClause:
+    # due: the period has ended by :as_of and holds approved, unpaid pay
+    cte = DUE_PERIODS_CTE.format(scope=" and factory_id = :fid" if scoped else "")
+    return text(f"""
+      with {cte}
+      select p.worker_id, p.full_name, p.payout, p.ps, p.pe,
+        coalesce(sum(wt.quantity) filter (where tt.code = 'COMBING'), 0)::float8 as combed_kg,
+        coalesce(sum(wt.quantity) filter (where tt.code in ('WEAVING','TWISTING')), 0)::float8 as woven_m,
+        coalesce(sum(wt.quantity * tt.rate_ngn_per_unit), 0)::float8 as total_pay
+      from due_periods p
+      join work_days wd on wd.worker_id = p.worker_id and wd.work_date between p.ps and p.pe
+      join work_tasks wt on wt.work_day_id = wd.id
+      join task_types tt on tt.id = wt.task_type_id
+      where p.pe <= cast(:as_of as date)
+        and wt.status='approved'
+        and wt.paid_run_id is null
+      group by p.worker_id, p.full_name, p.payout, p.ps, p.pe
+      having coalesce(sum(wt.quantity * tt.rate_ngn_per_unit), 0) > 0
+      order by p.full_name asc, p.worker_id asc
+    """)
+
+# (factory scope, as_of) -> (etag, body); cleared on any audited commit in
+# this process, so other workers can lag by up to PAYROLL_DUE_CACHE_SECONDS
+_payroll_due_cache = TTLCache(maxsize=256, ttl=PAYROLL_DUE_CACHE_SECONDS)
+
 @app.get("/api/payroll/due")
-def payroll_due(as_of: date = Query(default=None), u=Depends(get_current_user)):
+def payroll_due(request: Request, as_of: date = Query(default=None), u=Depends(current_user)):
     # supervisors see only their factory scope (if any); admins see all
     if as_of is None:
         as_of = date.today()
 
-    with engine.begin() as conn:
-        # load workers (respect factory scope)
-        if u["role"] == "supervisor" and u.get("factory_id"):
-            wrows = conn.execute(text("""
-                select id, full_name, payout, payout_anchor_date, factory_id
-                from workers
-                where is_active = true and factory_id = :fid
-                order by full_name asc
-            """), {"fid": str(u["factory_id"])}).fetchall()
-        else:
-            wrows = conn.execute(text("""
-                select id, full_name, payout, payout_anchor_date, factory_id
-                from workers
-                where is_active = true
-                order by full_name asc
-            """)).fetchall()
-
-        due = []
-        for r in wrows:
-            worker_id, full_name, payout, anchor, factory_id = r
-            if not anchor:
-                continue
+    scoped = u["role"] == "supervisor" and bool(u.get("factory_id"))
+    key = (str(u["factory_id"]) if scoped else None, as_of)
+    # only cache while the listener is up: it's what invalidates entries for
+    # writes made by other worker processes
+    cached = _pending_ready.is_set()
+    hit = _payroll_due_cache.get(key) if cached else None
+    if hit is None:
+        gen = _payroll_due_cache.generation
+        body = orjson.dumps(_payroll_due_rows(as_of, key[0]))
+        hit = ('"%s"' % hashlib.sha256(body).hexdigest()[:32], body)
+        if cached:
+            _payroll_due_cache.set(key, hit, generation=gen)
+
+    etag, body = hit
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@dataclass(slots=True)
+class DueRow:
+    # field order is the JSON key order
+    worker_id: UUID
+    full_name: str
+    payout: str
+    period_start: date
+    period_end: date
+    approved_combed_kg: float
+    approved_woven_m: float
+    approved_total_pay_ngn: float
 
-            pstart, pend = compute_period(payout, anchor, as_of)
+def _payroll_due_rows(as_of: date, fid: Optional[str]) -> List[DueRow]:
+    scoped = fid is not None
+    params = {"as_of": as_of}
+    if scoped:
+        params["fid"] = fid
 
-            # Due means: period has ended (or is today end) AND there is approved unpaid work in it
-            if pend > as_of:
-                continue
+    with ro_conn() as conn:
+        rows = conn.execute(_payroll_due_sql(scoped), params).fetchall()
 
-            x = conn.execute(text("""
-                select
-                  coalesce(sum(case when tt.code='COMBING' then wt.quantity else 0 end), 0) as combed_kg,
-                  coalesce(sum(case when tt.code in ('WEAVING','TWISTING') then wt.quantity else 0 end), 0) as woven_m,
-                  coalesce(sum(case when tt.code='COMBING' then wt.quantity*tt.rate_ngn_per_unit else 0 end), 0)
-                  + coalesce(sum(case when tt.code in ('WEAVING','TWISTING') then wt.quantity*tt.rate_ngn_per_unit else 0 end), 0)
-                  + coalesce(sum(case when tt.code not in ('COMBING','WEAVING','TWISTING') then wt.quantity*tt.rate_ngn_per_unit else 0 end), 0)
-                  as total_pay
-                from work_tasks wt
-                join work_days wd on wd.id = wt.work_day_id
-                join task_types tt on tt.id = wt.task_type_id
-                where wd.worker_id = :wid
-                  and wd.work_date between :start and :end
-                  and wt.status='approved'
-                  and wt.paid_run_id is null
-            """), {"wid": str(worker_id), "start": pstart, "end": pend}).fetchone()
-
-            combed_kg = float(x[0])
-            woven_m = float(x[1])
-            total_pay = float(x[2])
-
-            if total_pay > 0:
-                due.append({
-                    "worker_id": str(worker_id),
-                    "full_name": full_name,
-                    "payout": payout,
-                    "period_start": str(pstart),
-                    "period_end": str(pend),
-                    "approved_combed_kg": combed_kg,
-                    "approved_woven_m": woven_m,
-                    "approved_total_pay_ngn": total_pay,
-                })
-
-    return due
+    # rows are already (uuid, name, payout, date, date, float8 x3)
+    return [DueRow(*r) for r in rows]
 
         
-def assert_workday_open_by_task(conn, task_id: UUID):
-    row = conn.execute(text("""
-      select wd.is_closed
-      from work_tasks wt
-      join work_days wd on wd.id = wt.work_day_id
-      where wt.id = :tid
-    """), {"tid": str(task_id)}).fetchone()
-
-    if not row:
-        raise HTTPException(404, "Task not found")
-
-    if row[0] is True:
-        raise HTTPException(400, "Work day is closed")
-
-
+# landing page; mounted last so it only catches paths no route matched
+app.mount("/", StaticFiles(directory="static", html=True), name="root")
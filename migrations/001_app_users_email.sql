@@ -0,0 +1,31 @@
+-- login looks users up by exact email; the API lower-cases before writing.
+-- Apply with psql -v ON_ERROR_STOP=1 -f (no --single-transaction: create
+-- index concurrently can't run inside a transaction block), so a failed
+-- preflight stops the file before anything is folded.
+
+begin;
+-- hold off writes between the duplicate check and the fold
+lock table app_users in share row exclusive mode;
+
+do $$
+declare
+  dups text;
+begin
+  select string_agg(emails, '; ') into dups
+  from (
+    select string_agg(email, ', ' order by email) as emails
+    from app_users
+    group by lower(trim(email))
+    having count(*) > 1
+  ) d;
+  if dups is not null then
+    raise exception 'app_users emails that differ only by case/whitespace; merge them first: %', dups;
+  end if;
+end $$;
+
+update app_users set email = lower(trim(email)) where email <> lower(trim(email));
+commit;
+
+-- if this is interrupted it leaves an INVALID index that "if not exists"
+-- would skip: drop index concurrently app_users_email_idx, then rerun
+create unique index concurrently if not exists app_users_email_idx on app_users (email);
@@ -0,0 +1,39 @@
+-- feeds the in-process pending approvals cache and payroll_due invalidation
+-- (LISTEN pending_tasks in main.py)
+-- payload: the changed task id, or '*' when a joined table changed
+create or replace function notify_pending_tasks() returns trigger
+language plpgsql as $$
+begin
+  if tg_table_name = 'work_tasks' then
+    if tg_op = 'DELETE' then
+      perform pg_notify('pending_tasks', old.id::text);
+    else
+      perform pg_notify('pending_tasks', new.id::text);
+    end if;
+  else
+    perform pg_notify('pending_tasks', '*');
+  end if;
+  return null;
+end $$;
+
+drop trigger if exists work_tasks_pending_notify on work_tasks;
+create trigger work_tasks_pending_notify
+  after insert or update or delete on work_tasks
+  for each row execute function notify_pending_tasks();
+
+drop trigger if exists work_days_pending_notify on work_days;
+create trigger work_days_pending_notify
+  after update of worker_id, work_date, logged_by on work_days
+  for each statement execute function notify_pending_tasks();
+
+-- payout/anchor/is_active don't show in pending rows but move payroll_due
+-- periods, which main.py invalidates off the same channel
+drop trigger if exists workers_pending_notify on workers;
+create trigger workers_pending_notify
+  after update of full_name, payout, payout_anchor_date, is_active on workers
+  for each statement execute function notify_pending_tasks();
+
+drop trigger if exists task_types_pending_notify on task_types;
+create trigger task_types_pending_notify
+  after insert or update or delete on task_types
+  for each statement execute function notify_pending_tasks();
@@ -0,0 +1,21 @@
+-- create index concurrently can't run inside a transaction block: apply this
+-- file statement by statement (e.g. psql -f without --single-transaction).
+-- work_days(worker_id, work_date) is already covered by the unique key the
+-- work-day upsert conflicts on.
+
+-- payroll / payroll due / reports: approved, unpaid tasks of a day
+create index concurrently if not exists idx_wt_workday_status_unpaid
+  on work_tasks (work_day_id, status) where paid_run_id is null;
+
+-- approvals queue and the pending cache reload
+create index concurrently if not exists idx_wt_pending
+  on work_tasks (work_day_id) where status = 'pending';
+
+create index concurrently if not exists idx_wt_tasktype
+  on work_tasks (task_type_id);
+
+-- /api/audit, filtered and unfiltered
+create index concurrently if not exists idx_audit_entity
+  on audit_logs (entity_type, entity_id, created_at desc);
+create index concurrently if not exists idx_audit_created
+  on audit_logs (created_at desc);
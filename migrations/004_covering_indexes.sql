@@ -0,0 +1,15 @@
+-- create index concurrently can't run inside a transaction block: apply this
+-- file statement by statement (e.g. psql -f without --single-transaction).
+-- Run ANALYZE work_tasks afterwards so the planner sees it.
+-- work_days keeps only its unique (worker_id, work_date) key: the period
+-- lookup is one heap fetch per day, small next to the task scan below.
+
+-- payroll / payroll due aggregates: approved, unpaid tasks with the columns
+-- they sum, so the aggregates don't visit the heap
+create index concurrently if not exists idx_wt_due_cov
+  on work_tasks (work_day_id) include (task_type_id, quantity, approved_pay_ngn)
+  where status = 'approved' and paid_run_id is null;
+
+-- superseded by idx_wt_due_cov (approved) and 003's idx_wt_pending (pending);
+-- one less index for every work_tasks write to maintain
+drop index concurrently if exists idx_wt_workday_status_unpaid;